@@ -1,31 +1,89 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, update, insert, delete, bindparam, inspect, text, or_, and_, func, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.mysql import insert as mysql_insert, match as mysql_match
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 import os
+import json
+import math
+import threading
+import time
+import uuid
+import re
+import itertools
+import unicodedata
+from collections import OrderedDict
 from functools import wraps
 import csv
 import io
+import gzip
+import hashlib
+import zlib
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
+from openpyxl import load_workbook
 from config import Config
 import pymysql
 from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+
+
+def _json_default(obj):
+    """Serializa los tipos que devuelven las proyecciones (fechas y Decimal)"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no es serializable a JSON")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask basado en orjson, con respaldo a la librería estándar"""
+    default = staticmethod(_json_default)
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json_provider_class = FastJSONProvider
+app.json = FastJSONProvider(app)
 app.secret_key = Config.SECRET_KEY
 app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = Config.SQLALCHEMY_TRACK_MODIFICATIONS
 load_dotenv()
 db = SQLAlchemy(app)
 
-# Crear tablas al iniciar la aplicación
-with app.app_context():
-    try:
-        db.create_all()
-        print("Tablas de base de datos creadas/verificadas exitosamente")
-    except Exception as e:
-        print(f"Error al crear tablas: {e}")
-
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -36,6 +94,7 @@ class User(db.Model):
     parent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     is_blocked = db.Column(db.Boolean, default=False)
+    subscription_expires_at = db.Column(db.DateTime, nullable=True, index=True)
     
     employees = db.relationship('User', backref=db.backref('parent', remote_side=[id]))
     
@@ -46,17 +105,15 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
     
     def is_expired(self):
-        if self.role == 'superadmin':
+        expires_at = self.subscription_expires_at
+        if self.role == 'superadmin' or expires_at is None:
             return False
         
-        current_time = datetime.now(timezone.utc)
-        created_time = self.created_at
+        # If expires_at is naive (no timezone info), assume it's UTC
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
         
-        # If created_at is naive (no timezone info), assume it's UTC
-        if created_time.tzinfo is None:
-            created_time = created_time.replace(tzinfo=timezone.utc)
-        
-        return current_time - created_time > timedelta(days=30)
+        return expires_at <= datetime.now(timezone.utc)
 
 
 class Product(db.Model):
@@ -68,9 +125,28 @@ class Product(db.Model):
     category = db.Column(db.String(50), nullable=False)
     store_type = db.Column(db.Enum('ropa', 'muebles', 'cerveza'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sku = db.Column(db.String(64), nullable=True)  # código de barras / SKU, único por administrador
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     owner = db.relationship('User', backref='products')
+    
+    __table_args__ = (
+        db.Index('ix_product_owner_store', 'user_id', 'store_type'),
+        db.UniqueConstraint('user_id', 'sku', name='uq_product_owner_sku'),
+    )
+
+class Customer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # administrador dueño
+    name = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)  # solo dígitos, ver normalize_phone()
+    address = db.Column(db.String(200), default='')
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'phone', name='uq_customer_owner_phone'),
+        db.Index('ix_customer_owner_name', 'user_id', 'name'),
+    )
 
 class Sale(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -82,7 +158,9 @@ class Sale(db.Model):
     customer_phone = db.Column(db.String(20), default='')
     payment_type = db.Column(db.String(20), default='cash')
     employee_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    client_key = db.Column(db.String(64), unique=True, nullable=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     
     product = db.relationship('Product', backref='sales')
     employee = db.relationship('User', backref='sales')
@@ -101,17 +179,1364 @@ class Credit(db.Model):
     next_payment_date = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.Enum('active', 'completed', 'overdue'), default='active')
     store_type = db.Column(db.Enum('muebles'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
 class CreditPayment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     credit_id = db.Column(db.Integer, db.ForeignKey('credit.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    payment_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    payment_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     notes = db.Column(db.String(200))
     
     credit = db.relationship('Credit', backref='payments')
 
+class StockMovement(db.Model):
+    """Kardex: cada cambio de stock queda registrado, nunca se modifica ni se borra"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    kind = db.Column(db.Enum('sale', 'restock', 'adjustment', 'return'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)  # positivo entra, negativo sale
+    stock_after = db.Column(db.Integer, nullable=True)
+    sale_id = db.Column(db.Integer, nullable=True)  # referencia sin FK: la venta puede estar archivada
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    notes = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        db.Index('ix_stock_movement_product_created', 'product_id', 'created_at'),
+    )
+
+class StockSnapshot(db.Model):
+    """Stock de cada producto en un instante; acota cuánto kardex hay que sumar"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    stock = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    last_movement_id = db.Column(db.Integer, nullable=True)  # último movimiento incluido en `stock`
+    
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_product_taken', 'product_id', 'taken_at'),
+    )
+
+class OutboxJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.Enum('pending', 'running', 'done', 'failed'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    locked_by = db.Column(db.String(36), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        db.Index('ix_outbox_job_status_run_after', 'status', 'run_after'),
+    )
+
+class IdempotencyKey(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)  # NULL mientras la petición está en curso
+    response_body = db.Column(db.Text, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+    )
+
+class CatalogVersion(db.Model):
+    """Versión del catálogo de cada tienda; se incrementa con cada alta o cambio de productos"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    store_type = db.Column(db.Enum('ropa', 'muebles', 'cerveza'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Columnas agregadas a tablas existentes: create_all() no las crea en bases ya desplegadas
+SCHEMA_UPGRADES = [
+    # (tabla, columna, DDL de la columna, índice único)
+    ('sale', 'client_key', 'VARCHAR(64) NULL', 'uq_sale_client_key'),
+    ('product', 'sku', 'VARCHAR(64) NULL', None),
+    ('sale', 'customer_id', 'INTEGER NULL', None),
+    ('credit', 'customer_id', 'INTEGER NULL', None),
+    ('user', 'subscription_expires_at', 'DATETIME NULL', None),
+    ('stock_snapshot', 'last_movement_id', 'INTEGER NULL', None),
+]
+
+SCHEMA_INDEXES = [
+    # (tabla, índice, DDL, dialecto donde aplica o None para todos)
+    ('product', 'ix_product_owner_store',
+     'CREATE INDEX ix_product_owner_store ON product (user_id, store_type)', None),
+    ('product', 'uq_product_owner_sku',
+     'CREATE UNIQUE INDEX uq_product_owner_sku ON product (user_id, sku)', None),
+    ('sale', 'ix_sale_customer_id', 'CREATE INDEX ix_sale_customer_id ON sale (customer_id)', None),
+    ('sale', 'ix_sale_created_at', 'CREATE INDEX ix_sale_created_at ON sale (created_at)', None),
+    ('credit_payment', 'ix_credit_payment_payment_date',
+     'CREATE INDEX ix_credit_payment_payment_date ON credit_payment (payment_date)', None),
+    ('credit', 'ix_credit_customer_id', 'CREATE INDEX ix_credit_customer_id ON credit (customer_id)', None),
+    ('user', 'ix_user_subscription_expires_at',
+     'CREATE INDEX ix_user_subscription_expires_at ON user (subscription_expires_at)', None),
+    ('product', 'ft_product_search',
+     'CREATE FULLTEXT INDEX ft_product_search ON product (name, category) WITH PARSER ngram', 'mysql'),
+]
+
+SCHEMA_DROPPED_FOREIGN_KEYS = [
+    # (tabla, tabla referenciada): FKs que ya no existen en el modelo
+    ('stock_movement', 'sale'),  # las ventas archivadas se borran de la tabla
+]
+
+def upgrade_schema():
+    """Agrega las columnas e índices de SCHEMA_UPGRADES y SCHEMA_INDEXES que falten en la base de datos"""
+    inspector = inspect(db.engine)
+    if db.engine.dialect.name == 'mysql':  # SQLite no aplica las FKs por defecto
+        for table, referred in SCHEMA_DROPPED_FOREIGN_KEYS:
+            for fk in inspector.get_foreign_keys(table):
+                if fk['referred_table'] == referred and fk.get('name'):
+                    with db.engine.begin() as conn:
+                        conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {fk['name']}"))
+                    print(f"Llave foránea eliminada: {table}.{fk['name']}")
+    
+    for table, column, ddl, unique_index in SCHEMA_UPGRADES:
+        columns = {c['name'] for c in inspector.get_columns(table)}
+        if column in columns:
+            continue
+        with db.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+            if unique_index:
+                conn.execute(text(f'CREATE UNIQUE INDEX {unique_index} ON {table} ({column})'))
+        print(f"Columna agregada: {table}.{column}")
+    
+    for table, index, ddl, dialect in SCHEMA_INDEXES:
+        if dialect and db.engine.dialect.name != dialect:
+            continue
+        existing = {i['name'] for i in inspector.get_indexes(table)}
+        existing.update(c['name'] for c in inspector.get_unique_constraints(table))
+        if index in existing:
+            continue
+        with db.engine.begin() as conn:
+            conn.execute(text(ddl))
+        print(f"Índice creado: {table}.{index}")
+
+def add_days(column, days):
+    """Expresión SQL que suma `days` días a una columna de fecha según el dialecto"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return func.datetime(column, f'+{int(days)} days', type_=db.DateTime)
+    if dialect == 'mysql':
+        return func.timestampadd(text('DAY'), int(days), column, type_=db.DateTime)
+    return column + timedelta(days=int(days))
+
+def backfill_subscription_expiry():
+    """Asigna el vencimiento (creación + periodo) a las cuentas anteriores a la columna, en una sola sentencia"""
+    result = db.session.execute(
+        update(User)
+        .where(User.subscription_expires_at.is_(None), User.role != 'superadmin')
+        .values(subscription_expires_at=add_days(User.created_at, Config.SUBSCRIPTION_DAYS))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        print(f"Vencimiento de suscripción asignado a {result.rowcount} cuentas")
+
+def sweep_expired_subscriptions():
+    """Bloquea en una sola sentencia todas las cuentas con la suscripción vencida"""
+    result = db.session.execute(
+        update(User)
+        .where(User.subscription_expires_at <= datetime.now(timezone.utc), User.is_blocked.isnot(True),
+               User.role != 'superadmin')
+        .values(is_blocked=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def renew_subscriptions(user_ids, days):
+    """Extiende `days` días la suscripción de las cuentas indicadas y de sus empleados, y las desbloquea.
+
+    Las cuentas vigentes se extienden desde su vencimiento actual y las vencidas desde hoy.
+    Los empleados que estaban bloqueados por vencimiento se desbloquean; los bloqueados a mano no.
+    """
+    now = datetime.now(timezone.utc)
+    new_expiry = case(
+        (User.subscription_expires_at > now, add_days(User.subscription_expires_at, days)),
+        else_=now + timedelta(days=days)
+    )
+    db.session.execute(
+        update(User)
+        .where(User.parent_id.in_(user_ids), User.role == 'empleado', User.subscription_expires_at <= now)
+        .values(is_blocked=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(User)
+        .where(User.parent_id.in_(user_ids), User.role == 'empleado')
+        .values(subscription_expires_at=new_expiry)
+        .execution_options(synchronize_session=False)
+    )
+    result = db.session.execute(
+        update(User)
+        .where(User.id.in_(user_ids), User.role != 'superadmin')
+        .values(subscription_expires_at=new_expiry, is_blocked=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def set_users_blocked(user_ids, blocked):
+    """Bloquea o desbloquea en una sola sentencia las cuentas indicadas"""
+    result = db.session.execute(
+        update(User)
+        .where(User.id.in_(user_ids), User.role != 'superadmin')
+        .values(is_blocked=blocked)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+# Crear tablas al iniciar la aplicación (después de declarar los modelos)
+with app.app_context():
+    try:
+        db.create_all()
+        upgrade_schema()
+        backfill_subscription_expiry()
+        print("Tablas de base de datos creadas/verificadas exitosamente")
+    except Exception as e:
+        print(f"Error al crear tablas: {e}")
+
+def project(stmt):
+    """Ejecuta un select de columnas y devuelve una lista de dicts sin cargar entidades ORM"""
+    result = db.session.execute(stmt)
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+def row_exists(stmt):
+    """Indica con un EXISTS si el select devuelve al menos una fila, sin cargar la colección"""
+    return bool(db.session.scalar(select(stmt.exists())))
+
+USER_COLUMNS = (
+    User.id, User.username, User.name, User.role, User.store_type,
+    User.created_at, User.is_blocked, User.subscription_expires_at
+)
+
+def expired_column():
+    """Columna calculada en SQL que indica si la suscripción ya venció"""
+    return case(
+        (User.subscription_expires_at <= datetime.now(timezone.utc), True), else_=False
+    ).label('is_expired')
+
+PRODUCT_COLUMNS = (
+    Product.id, Product.name, Product.price_provider,
+    Product.price_client, Product.stock, Product.category, Product.sku
+)
+
+SALE_COLUMNS = (
+    Sale.id,
+    Product.name.label('product_name'),
+    Sale.quantity,
+    Sale.total_price,
+    Sale.customer_name,
+    User.name.label('employee_name'),
+    Sale.payment_type,
+    Sale.created_at
+)
+
+CREDIT_COLUMNS = (
+    Credit.id, Credit.customer_name, Credit.customer_phone, Credit.customer_address,
+    Credit.product_name, Credit.total_amount, Credit.paid_amount, Credit.remaining_amount,
+    Credit.installment_amount, Credit.next_payment_date, Credit.status, Credit.created_at
+)
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json'
+}
+
+_static_versions = {}
+
+def static_url(filename):
+    """URL de un archivo estático con huella de contenido, cacheable indefinidamente"""
+    version = _static_versions.get(filename)
+    if version is None or app.debug:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            version = hashlib.md5(f.read()).hexdigest()[:12]
+        _static_versions[filename] = version
+    return url_for('static', filename=filename, v=version)
+
+@app.context_processor
+def inject_static_url():
+    return {'static_url': static_url}
+
+def choose_encoding(accept_encoding):
+    """Elige la codificación de compresión según el encabezado Accept-Encoding"""
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+def compress_stream(chunks, encoding):
+    """Comprime un iterable de fragmentos sin acumular la respuesta completa en memoria"""
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+@app.after_request
+def compress_response(response):
+    if request.endpoint == 'static' and 'v' in request.args:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None or response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    
+    if response.is_streamed or response.direct_passthrough:
+        # Respuestas en streaming (exportaciones, archivos): se comprimen por fragmentos
+        response.direct_passthrough = False
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < Config.COMPRESS_MIN_SIZE:
+            return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(body, quality=5))
+        else:
+            response.set_data(gzip.compress(body, compresslevel=6))
+    
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# Cola de tareas (outbox): los trabajos se escriben en la misma transacción que la venta
+# y se ejecutan fuera de la petición, en hilos del proceso o con `flask worker`.
+JOB_HANDLERS = {}
+
+_outbox_wakeup = threading.Event()
+_outbox_threads = []
+_outbox_lock = threading.Lock()
+
+def job_handler(kind):
+    """Registra la función que procesa los trabajos de un tipo"""
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue_job(kind, payload):
+    """Agrega un trabajo a la sesión actual; se confirma junto con la transacción en curso"""
+    job = OutboxJob(kind=kind, payload=json.dumps(payload))
+    db.session.add(job)
+    return job
+
+def notify_outbox():
+    """Despierta a los hilos de la cola después de un commit con trabajos nuevos"""
+    start_outbox_workers()
+    _outbox_wakeup.set()
+
+def claim_jobs(worker_id, limit):
+    """Reserva hasta `limit` trabajos pendientes para este worker, devolviendo antes a la cola los abandonados"""
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=Config.OUTBOX_LOCK_TIMEOUT)
+    # Un trabajo abandonado (su worker murió o se colgó) cuenta como intento fallido; si no,
+    # uno que siempre tumba al worker se reintentaría para siempre. `status` va primero en el
+    # SET porque MySQL evalúa las asignaciones en orden y debe ver el valor previo de `attempts`.
+    db.session.execute(
+        update(OutboxJob)
+        .where(OutboxJob.status == 'running', OutboxJob.locked_at < stale)
+        .ordered_values(
+            (OutboxJob.status, case((OutboxJob.attempts + 1 >= Config.OUTBOX_MAX_ATTEMPTS, 'failed'), else_='pending')),
+            (OutboxJob.attempts, OutboxJob.attempts + 1),
+            (OutboxJob.last_error, 'Tiempo de bloqueo agotado: el worker no terminó el trabajo'),
+            (OutboxJob.run_after, now),
+            (OutboxJob.locked_by, None),
+            (OutboxJob.locked_at, None),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimable = and_(OutboxJob.status == 'pending', OutboxJob.run_after <= now)
+    ids = db.session.execute(
+        select(OutboxJob.id).where(claimable).order_by(OutboxJob.id).limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.session.commit()
+        return []
+    
+    db.session.execute(
+        update(OutboxJob)
+        .where(OutboxJob.id.in_(ids), claimable)
+        .values(status='running', locked_by=worker_id, locked_at=now)
+    )
+    db.session.commit()
+    return OutboxJob.query.filter_by(locked_by=worker_id, status='running').order_by(OutboxJob.id).all()
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No hay manejador para el trabajo '{job.kind}'")
+        handler(json.loads(job.payload))
+        job.status = 'done'
+        job.last_error = None
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(OutboxJob, job.id)
+        job.attempts += 1
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=2 ** job.attempts)
+        print(f"Error en trabajo {job.id} ({job.kind}), intento {job.attempts}: {e}")
+    job.locked_by = None
+    job.locked_at = None
+    db.session.commit()
+
+def drain_outbox(worker_id=None, limit=None):
+    """Procesa un lote de trabajos; devuelve cuántos se ejecutaron"""
+    worker_id = worker_id or str(uuid.uuid4())
+    jobs = claim_jobs(worker_id, limit or Config.OUTBOX_BATCH_SIZE)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+def purge_outbox_jobs():
+    """Elimina los trabajos terminados más antiguos que OUTBOX_RETENTION_DAYS; devuelve cuántos se borraron"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=Config.OUTBOX_RETENTION_DAYS)
+    result = db.session.execute(
+        delete(OutboxJob).where(OutboxJob.status == 'done', OutboxJob.run_after < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def outbox_loop(stop_event=None):
+    worker_id = str(uuid.uuid4())
+    last_purge = 0
+    while stop_event is None or not stop_event.is_set():
+        processed = 0
+        try:
+            with app.app_context():
+                processed = drain_outbox(worker_id)
+                if time.monotonic() - last_purge > 3600:
+                    purge_idempotency_keys()
+                    purge_outbox_jobs()
+                    if snapshot_due():
+                        take_stock_snapshot()
+                    blocked = sweep_expired_subscriptions()
+                    if blocked:
+                        print(f"Cuentas bloqueadas por vencimiento: {blocked}")
+                    last_purge = time.monotonic()
+        except Exception as e:
+            print(f"Error en el worker de la cola: {e}")
+        if not processed:
+            _outbox_wakeup.wait(Config.OUTBOX_POLL_SECONDS)
+            _outbox_wakeup.clear()
+
+def start_outbox_workers():
+    """Arranca (una sola vez por proceso) los hilos que vacían la cola"""
+    if _outbox_threads or Config.OUTBOX_WORKER_THREADS <= 0:
+        return
+    with _outbox_lock:
+        if _outbox_threads:
+            return
+        for i in range(Config.OUTBOX_WORKER_THREADS):
+            thread = threading.Thread(target=outbox_loop, name=f'outbox-worker-{i}', daemon=True)
+            thread.start()
+            _outbox_threads.append(thread)
+
+@job_handler('sale.created')
+def handle_sale_created(payload):
+    sale = db.session.get(Sale, payload['sale_id'])
+    if not sale:
+        return
+    product = db.session.get(Product, sale.product_id)
+    if product and product.stock <= Config.LOW_STOCK_THRESHOLD:
+        print(f"[ALERTA] Stock bajo: {product.name} (id {product.id}) quedan {product.stock} unidades")
+
+# Idempotencia: una petición de escritura repetida con el mismo encabezado Idempotency-Key
+# devuelve la respuesta guardada en lugar de volver a ejecutarse.
+IDEMPOTENT_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+class LRUCache:
+    """Caché LRU en memoria, segura entre hilos"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+_idempotency_cache = LRUCache(Config.IDEMPOTENCY_CACHE_SIZE)
+
+def idempotency_age(created_at):
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created_at
+
+def idempotency_expired(created_at):
+    return idempotency_age(created_at) > timedelta(hours=Config.IDEMPOTENCY_TTL_HOURS)
+
+def replay_response(stored):
+    request_hash, status_code, body, mimetype, created_at = stored
+    if request_hash != g.idempotency_hash:
+        return jsonify({'error': 'La clave de idempotencia ya se usó con otra solicitud'}), 422
+    response = app.response_class(body, status=status_code, mimetype=mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+@app.before_request
+def check_idempotency_key():
+    key = request.headers.get('Idempotency-Key')
+    user_id = session.get('user_id')
+    if request.method not in IDEMPOTENT_METHODS or not key or not user_id:
+        return None
+    if len(key) > 100:
+        return jsonify({'error': 'Idempotency-Key demasiado larga'}), 400
+    
+    g.idempotency_hash = hashlib.sha256(
+        request.method.encode() + request.path.encode() + b'\n' + request.get_data()
+    ).hexdigest()
+    cache_key = (user_id, key)
+    
+    stored = _idempotency_cache.get(cache_key)
+    if stored is not None and not idempotency_expired(stored[4]):
+        return replay_response(stored)
+    
+    # Reservar la clave; si otra petición ya la reservó, se reproduce su respuesta
+    try:
+        db.session.add(IdempotencyKey(user_id=user_id, key=key, request_hash=g.idempotency_hash))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        row = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        if row is None:
+            return jsonify({'error': 'Solicitud en proceso, intenta de nuevo'}), 409
+        if idempotency_expired(row.created_at):
+            db.session.delete(row)
+            db.session.commit()
+            return check_idempotency_key()
+        if row.status_code is None:
+            if idempotency_age(row.created_at) <= timedelta(seconds=Config.IDEMPOTENCY_LOCK_SECONDS):
+                return jsonify({'error': 'Solicitud en proceso, intenta de nuevo'}), 409
+            # Reserva de un worker que murió a mitad de la petición: se libera y se vuelve a intentar
+            db.session.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.id == row.id, IdempotencyKey.status_code.is_(None)))
+            db.session.commit()
+            return check_idempotency_key()
+        stored = (row.request_hash, row.status_code, row.response_body, row.mimetype, row.created_at)
+        _idempotency_cache.set(cache_key, stored)
+        return replay_response(stored)
+    
+    g.idempotency_key = cache_key
+    return None
+
+@app.after_request
+def store_idempotent_response(response):
+    cache_key = g.pop('idempotency_key', None)
+    if cache_key is None:
+        return response
+    
+    user_id, key = cache_key
+    try:
+        if response.status_code >= 500 or response.is_streamed:
+            # Los errores del servidor no se guardan: el cliente puede reintentar
+            db.session.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+        else:
+            body = response.get_data(as_text=True)
+            db.session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+                .values(status_code=response.status_code, response_body=body, mimetype=response.mimetype)
+            )
+            _idempotency_cache.set(cache_key, (
+                g.idempotency_hash, response.status_code, body, response.mimetype, datetime.now(timezone.utc)
+            ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al guardar respuesta idempotente: {e}")
+    return response
+
+def purge_idempotency_keys():
+    """Elimina las claves de idempotencia vencidas; devuelve cuántas se borraron"""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=Config.IDEMPOTENCY_TTL_HOURS)
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+def catalog_owner_id(user):
+    """Id del administrador dueño del catálogo: los empleados usan el de su administrador"""
+    if user.role == 'empleado' and user.parent_id:
+        return user.parent_id
+    return user.id
+
+# Búsqueda de productos: FULLTEXT (ngram) en MySQL; en otros motores, un trie de prefijos
+# en memoria por tienda, reconstruido cuando cambia el catálogo.
+def normalize_search_text(value):
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode('ascii')
+    return value.lower()
+
+def search_tokens(value):
+    return [token for token in re.split(r'[^a-z0-9]+', normalize_search_text(value)) if token]
+
+class PrefixTrie:
+    """Trie de prefijos aplanado: cada prefijo de palabra apunta a los ids que lo contienen.
+    
+    Los productos se insertan ordenados por nombre, así que cada lista de ids ya está
+    en el orden en que se devuelven los resultados.
+    """
+    __slots__ = ('prefixes', 'sets')
+    
+    def __init__(self, rows):
+        self.prefixes = {}
+        self.sets = LRUCache(256)  # conjuntos de ids por prefijo, para consultas de varias palabras
+        for product_id, name, category in sorted(rows, key=lambda row: normalize_search_text(row[1])):
+            terms = set(search_tokens(name) + search_tokens(category))
+            prefixes = {term[:i] for term in terms for i in range(1, len(term) + 1)}
+            for prefix in prefixes:
+                self.prefixes.setdefault(prefix, []).append(product_id)
+    
+    def _id_set(self, prefix):
+        ids = self.sets.get(prefix)
+        if ids is None:
+            ids = frozenset(self.prefixes.get(prefix, ()))
+            self.sets.set(prefix, ids)
+        return ids
+    
+    def search(self, query):
+        """Genera, ordenados por nombre, los ids con un término que empieza por cada palabra"""
+        tokens = sorted(set(search_tokens(query)), key=lambda token: len(self.prefixes.get(token, ())))
+        if not tokens:
+            return
+        others = [self._id_set(token) for token in tokens[1:]]
+        for product_id in self.prefixes.get(tokens[0], ()):
+            if all(product_id in ids for ids in others):
+                yield product_id
+
+def bump_catalog_version(owner_id, store_type):
+    """Incrementa la versión del catálogo dentro de la transacción en curso"""
+    updated = db.session.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.user_id == owner_id, CatalogVersion.store_type == store_type)
+        .values(version=CatalogVersion.version + 1)
+    ).rowcount
+    if not updated:
+        db.session.add(CatalogVersion(user_id=owner_id, store_type=store_type, version=1))
+
+def get_catalog_version(owner_id, store_type):
+    version = db.session.execute(
+        select(CatalogVersion.version)
+        .where(CatalogVersion.user_id == owner_id, CatalogVersion.store_type == store_type)
+    ).scalar()
+    return version or 0
+
+_search_tries = LRUCache(Config.SEARCH_TRIE_CACHE_SIZE)
+_search_tries_lock = threading.Lock()  # una sola reconstrucción a la vez
+
+def get_search_trie(owner_id, store_type):
+    key = (owner_id, store_type)
+    version = get_catalog_version(owner_id, store_type)
+    cached = _search_tries.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _search_tries_lock:
+        # Otra petición pudo reconstruirlo mientras se esperaba el bloqueo
+        cached = _search_tries.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.category)
+            .where(Product.user_id == owner_id, Product.store_type == store_type)
+        ).all()
+        trie = PrefixTrie(rows)
+        _search_tries.set(key, (version, trie))
+    return trie
+
+# Lectura de códigos de barras: mapa código -> id de producto por tienda, en memoria,
+# reconstruido cuando cambia la versión del catálogo.
+_code_maps = {}
+_code_maps_lock = threading.Lock()
+
+def normalize_code(code):
+    return (code or '').strip()
+
+def find_product_id_by_code(owner_id, store_type, code):
+    key = (owner_id, store_type)
+    version = get_catalog_version(owner_id, store_type)
+    cached = _code_maps.get(key)
+    if not cached or cached[0] != version:
+        codes = dict(db.session.execute(
+            select(Product.sku, Product.id)
+            .where(Product.user_id == owner_id, Product.store_type == store_type, Product.sku.isnot(None))
+        ).all())
+        cached = (version, codes)
+        with _code_maps_lock:
+            _code_maps[key] = cached
+    return cached[1].get(normalize_code(code))
+
+# Catálogo para las terminales de venta: JSON ya serializado por (dueño, tienda, versión).
+# Primer nivel: LRU en memoria del proceso; segundo nivel: archivos en CATALOG_CACHE_DIR,
+# compartidos entre workers. Solo las escrituras de productos cambian la versión; los cambios
+# de stock se envían como delta a partir del kardex (cursor = último id de movimiento visto).
+_catalog_cache = LRUCache(Config.CATALOG_CACHE_SIZE)
+
+def _catalog_cache_path(owner_id, store_type, version):
+    return os.path.join(Config.CATALOG_CACHE_DIR, f'{owner_id}-{store_type}-{version}.json')
+
+def _read_catalog_file(path):
+    try:
+        with open(path, 'rb') as f:
+            cursor = int(f.readline())
+            blob = f.read()
+        os.utime(path)  # marca de uso para el desalojo LRU entre procesos
+    except (OSError, ValueError):
+        return None
+    return cursor, blob
+
+def _write_catalog_file(owner_id, store_type, version, cursor, blob):
+    """Escribe el archivo de forma atómica, borra versiones viejas de la tienda y aplica el límite LRU"""
+    os.makedirs(Config.CATALOG_CACHE_DIR, exist_ok=True)
+    path = _catalog_cache_path(owner_id, store_type, version)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'%d\n' % cursor)
+        f.write(blob)
+    os.replace(tmp_path, path)
+    
+    prefix = f'{owner_id}-{store_type}-'
+    entries = []
+    for name in os.listdir(Config.CATALOG_CACHE_DIR):
+        if not name.endswith('.json'):
+            continue
+        full = os.path.join(Config.CATALOG_CACHE_DIR, name)
+        try:
+            if name.startswith(prefix) and full != path:
+                os.remove(full)
+            else:
+                entries.append((os.stat(full).st_mtime, full))
+        except OSError:
+            pass  # otro worker ya lo borró
+    entries.sort()
+    for _, full in entries[:max(len(entries) - Config.CATALOG_CACHE_FILES, 0)]:
+        try:
+            os.remove(full)
+        except OSError:
+            pass
+
+def _build_catalog_blob(owner_id, store_type, version):
+    # El cursor se lee antes que los productos: un movimiento concurrente solo se reenvía en el delta
+    cursor = db.session.scalar(select(func.max(StockMovement.id))) or 0
+    products = project(
+        select(*PRODUCT_COLUMNS)
+        .where(Product.store_type == store_type, Product.user_id == owner_id)
+        .order_by(Product.id)
+    )
+    built = (cursor, app.json.dumps(products).encode('utf-8'))
+    try:
+        _write_catalog_file(owner_id, store_type, version, *built)
+    except OSError as e:
+        print(f"No se pudo guardar el catálogo en disco: {e}")
+    return built
+
+def get_catalog_blob(owner_id, store_type):
+    """Devuelve (versión, cursor, JSON del catálogo en bytes) sin consultar productos si ya está en caché.
+    
+    Si solo cambia el stock la versión no avanza; cuando el cursor del blob queda más de
+    CATALOG_MAX_CURSOR_LAG movimientos atrás se reconstruye, para que el delta no crezca sin límite.
+    """
+    version = get_catalog_version(owner_id, store_type)
+    key = (owner_id, store_type, version)
+    cached = _catalog_cache.get(key)
+    if cached is None:
+        cached = _read_catalog_file(_catalog_cache_path(owner_id, store_type, version))
+    if cached is not None:
+        latest = db.session.scalar(select(func.max(StockMovement.id))) or 0
+        if latest - cached[0] > Config.CATALOG_MAX_CURSOR_LAG:
+            cached = None
+    if cached is None:
+        cached = _build_catalog_blob(owner_id, store_type, version)
+    _catalog_cache.set(key, cached)
+    return version, cached[0], cached[1]
+
+def catalog_stock_delta(owner_id, store_type, cursor):
+    """Devuelve (nuevo cursor, [[id, stock], ...]) de los productos con movimientos posteriores a `cursor`.
+    
+    Un movimiento con id menor al cursor puede confirmarse después de leído el cursor, así que se
+    relee una ventana de CATALOG_DELTA_WINDOW ids; el cliente recibe el stock actual y aplicar
+    de nuevo un producto ya actualizado no cambia nada.
+    """
+    new_cursor = max(db.session.scalar(select(func.max(StockMovement.id))) or 0, cursor)
+    changed = select(StockMovement.product_id).where(StockMovement.id > cursor - Config.CATALOG_DELTA_WINDOW)
+    rows = db.session.execute(
+        select(Product.id, Product.stock)
+        .where(Product.user_id == owner_id, Product.store_type == store_type, Product.id.in_(changed))
+    ).all()
+    return new_cursor, [[product_id, stock] for product_id, stock in rows]
+
+# Clientes: un registro por (administrador, teléfono) al que apuntan ventas y créditos
+def normalize_phone(phone):
+    return re.sub(r'\D', '', str(phone or ''))[:20]
+
+def resolve_customer_ids(owner_id, customers):
+    """Devuelve {teléfono: id de cliente}, creando los clientes que falten.
+    
+    `customers` es una lista de dicts con phone, name y address; los teléfonos vacíos se ignoran.
+    """
+    wanted = {}
+    for customer in customers:
+        phone = normalize_phone(customer.get('phone'))
+        if phone and phone not in wanted:
+            wanted[phone] = customer
+    if not wanted:
+        return {}
+    
+    def existing(phones):
+        ids = {}
+        for i in range(0, len(phones), Config.IMPORT_BATCH_SIZE):  # lista IN acotada
+            ids.update(db.session.execute(
+                select(Customer.phone, Customer.id)
+                .where(Customer.user_id == owner_id, Customer.phone.in_(phones[i:i + Config.IMPORT_BATCH_SIZE]))
+            ).all())
+        return ids
+    
+    ids = existing(list(wanted))
+    missing = [
+        {'user_id': owner_id, 'phone': phone, 'name': (c.get('name') or 'Cliente')[:100],
+         'address': (c.get('address') or '')[:200], 'created_at': datetime.now(timezone.utc)}
+        for phone, c in wanted.items() if phone not in ids
+    ]
+    if missing:
+        # Otra petición puede crear alguno de estos clientes al mismo tiempo: el duplicado se omite
+        # sin descartar el resto del bloque
+        dialect = db.engine.dialect.name
+        if dialect == 'mysql':
+            stmt = mysql_insert(Customer.__table__)
+            db.session.execute(stmt.on_duplicate_key_update(phone=stmt.inserted.phone), missing)
+        elif dialect == 'sqlite':
+            stmt = sqlite_insert(Customer.__table__).on_conflict_do_nothing(index_elements=['user_id', 'phone'])
+            db.session.execute(stmt, missing)
+        else:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(Customer), missing)
+            except IntegrityError:
+                for customer in missing:
+                    try:
+                        with db.session.begin_nested():
+                            db.session.execute(insert(Customer), [customer])
+                    except IntegrityError:
+                        pass
+        ids.update(existing([c['phone'] for c in missing]))
+    return ids
+
+def resolve_customer_id(owner_id, phone, name, address=''):
+    return resolve_customer_ids(owner_id, [{'phone': phone, 'name': name, 'address': address}]).get(
+        normalize_phone(phone))
+
+# Kardex de inventario y fotos periódicas
+def record_stock_movement(product_id, kind, quantity, stock_after=None, sale_id=None, user_id=None, notes=None):
+    """Agrega un movimiento de stock a la transacción en curso"""
+    db.session.add(StockMovement(
+        product_id=product_id, kind=kind, quantity=quantity, stock_after=stock_after,
+        sale_id=sale_id, user_id=user_id, notes=notes
+    ))
+
+def record_opening_balances(owner_id=None):
+    """Registra como reposición inicial el stock de los productos que aún no tienen kardex"""
+    now = datetime.now(timezone.utc)
+    has_movements = select(StockMovement.id).where(StockMovement.product_id == Product.id).exists()
+    has_snapshot = select(StockSnapshot.id).where(StockSnapshot.product_id == Product.id).exists()
+    products = select(
+        Product.id, db.literal('restock'), Product.stock, Product.stock, db.literal('Saldo inicial'), db.literal(now)
+    ).where(~has_movements, ~has_snapshot)
+    if owner_id is not None:
+        products = products.where(Product.user_id == owner_id)
+    return db.session.execute(
+        insert(StockMovement).from_select(
+            ['product_id', 'kind', 'quantity', 'stock_after', 'notes', 'created_at'], products
+        )
+    ).rowcount
+
+def take_stock_snapshot():
+    """Guarda el stock actual de todos los productos; devuelve cuántas filas se escribieron"""
+    record_opening_balances()
+    now = datetime.now(timezone.utc)
+    # El stock y el último movimiento se leen en la misma sentencia: el kardex se reanuda por id,
+    # no por hora, y una venta concurrente no se cuenta dos veces
+    last_movement = (
+        select(db.func.max(StockMovement.id)).where(StockMovement.product_id == Product.id).scalar_subquery()
+    )
+    count = db.session.execute(
+        insert(StockSnapshot).from_select(
+            ['product_id', 'stock', 'taken_at', 'last_movement_id'],
+            select(Product.id, Product.stock, db.literal(now), db.func.coalesce(last_movement, 0))
+        )
+    ).rowcount
+    db.session.commit()
+    return count
+
+def snapshot_due():
+    last = db.session.execute(select(db.func.max(StockSnapshot.taken_at))).scalar()
+    if last is None:
+        return True
+    if last.tzinfo is None:
+        last = last.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - last > timedelta(hours=Config.STOCK_SNAPSHOT_INTERVAL_HOURS)
+
+def ledger_stock_at(at, owner_id=None):
+    """Stock según el kardex en la fecha `at`: última foto anterior + movimientos posteriores.
+    
+    Devuelve {product_id: stock}. Después de la foto se suman los movimientos con id mayor a su
+    last_movement_id (las fotos anteriores a esa columna se reanudan por hora).
+    """
+    latest = (
+        select(StockSnapshot.product_id, db.func.max(StockSnapshot.taken_at).label('taken_at'))
+        .where(StockSnapshot.taken_at <= at)
+        .group_by(StockSnapshot.product_id)
+        .subquery()
+    )
+    snapshots = (
+        select(StockSnapshot.product_id, StockSnapshot.stock, StockSnapshot.taken_at, StockSnapshot.last_movement_id)
+        .join(latest, and_(StockSnapshot.product_id == latest.c.product_id,
+                           StockSnapshot.taken_at == latest.c.taken_at))
+    )
+    if owner_id is not None:
+        owner_products = select(Product.id).where(Product.user_id == owner_id)
+        snapshots = snapshots.where(StockSnapshot.product_id.in_(owner_products))
+    snapshots = snapshots.subquery()
+    
+    movements = (
+        select(StockMovement.product_id, db.func.sum(StockMovement.quantity))
+        .outerjoin(snapshots, StockMovement.product_id == snapshots.c.product_id)
+        .where(StockMovement.created_at <= at,
+               or_(snapshots.c.product_id.is_(None),
+                   StockMovement.id > snapshots.c.last_movement_id,
+                   and_(snapshots.c.last_movement_id.is_(None), StockMovement.created_at > snapshots.c.taken_at)))
+        .group_by(StockMovement.product_id)
+    )
+    if owner_id is not None:
+        movements = movements.where(StockMovement.product_id.in_(owner_products))
+    
+    stock = dict(db.session.execute(select(snapshots.c.product_id, snapshots.c.stock)).all())
+    for product_id, delta in db.session.execute(movements):
+        stock[product_id] = stock.get(product_id, 0) + int(delta or 0)
+    return stock
+
+# Archivo histórico de ventas y abonos por mes cerrado (CSV comprimido con gzip + manifest.json)
+ARCHIVE_SOURCES = {
+    # tabla: (modelo, columna de fecha, select con columnas desnormalizadas para leer sin joins)
+    'sale': (
+        Sale, Sale.created_at,
+        select(*Sale.__table__.c, Product.user_id.label('owner_id'),
+               Product.price_client.label('unit_price'), User.name.label('employee_name'))
+        .outerjoin(Product, Sale.product_id == Product.id)
+        .outerjoin(User, Sale.employee_id == User.id)
+    ),
+    'credit_payment': (
+        CreditPayment, CreditPayment.payment_date,
+        select(*CreditPayment.__table__.c, Customer.user_id.label('owner_id'),
+               Credit.customer_name, Credit.product_name)
+        .outerjoin(Credit, CreditPayment.credit_id == Credit.id)
+        .outerjoin(Customer, Credit.customer_id == Customer.id)
+    ),
+}
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def next_month(value):
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def archive_cutoff(months=None):
+    """Inicio del mes más antiguo que se conserva en las tablas; lo anterior es un periodo cerrado"""
+    months = Config.ARCHIVE_RETENTION_MONTHS if months is None else months
+    cutoff = month_start(datetime.now(timezone.utc))
+    for _ in range(months):
+        cutoff = month_start(cutoff - timedelta(days=1))
+    return cutoff
+
+def load_archive_manifest():
+    path = os.path.join(Config.ARCHIVE_DIR, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_archive_manifest(manifest):
+    """Escribe el manifiesto de forma atómica (archivo temporal + reemplazo)"""
+    path = os.path.join(Config.ARCHIVE_DIR, 'manifest.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _archive_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+def recover_archive_parts(table, manifest):
+    """Resuelve partes que quedaron fuera del manifiesto por una ejecución interrumpida.
+
+    Si las filas de la parte siguen en la tabla, el borrado no llegó a confirmarse y la parte
+    se descarta; si ya no están, la parte es la única copia y se agrega al manifiesto.
+    """
+    model = ARCHIVE_SOURCES[table][0]
+    folder = os.path.join(Config.ARCHIVE_DIR, table)
+    if not os.path.isdir(folder):
+        return
+    listed = {part['file'] for parts in manifest.get(table, {}).values() for part in parts}
+    for name in sorted(os.listdir(folder)):
+        relative = f'{table}/{name}'
+        if not name.endswith('.csv.gz') or relative in listed:
+            continue
+        path = os.path.join(folder, name)
+        ids = [int(row['id']) for row in read_archive_part(path)]
+        if not ids or row_exists(select(model.id).where(model.id == ids[0])):
+            os.remove(path)
+            print(f"Parte de archivo descartada (sin confirmar): {relative}")
+            continue
+        period = name[:7]
+        manifest.setdefault(table, {}).setdefault(period, []).append({
+            'file': relative, 'rows': len(ids), 'first_id': min(ids), 'last_id': max(ids),
+            'sha256': file_sha256(path), 'archived_at': datetime.now(timezone.utc).isoformat()
+        })
+        save_archive_manifest(manifest)
+        print(f"Parte de archivo recuperada: {relative}")
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def archive_period(table, start, manifest, dry_run=False):
+    """Mueve a un CSV comprimido las filas de `table` del mes que empieza en `start` y las borra.
+
+    Orden: escribir la parte, borrar y confirmar en la base, registrar en el manifiesto.
+    Devuelve la cantidad de filas archivadas.
+    """
+    model, date_column, source = ARCHIVE_SOURCES[table]
+    end = next_month(start)
+    period = start.strftime('%Y-%m')
+    stmt = (
+        source.where(date_column >= start, date_column < end)
+        .order_by(model.id)
+        .execution_options(yield_per=Config.IMPORT_BATCH_SIZE)
+    )
+    if dry_run:
+        return db.session.scalar(select(func.count(model.id)).where(date_column >= start, date_column < end))
+    
+    parts = manifest.setdefault(table, {}).setdefault(period, [])
+    relative = f'{table}/{period}-{len(parts) + 1:03d}.csv.gz'
+    path = os.path.join(Config.ARCHIVE_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    ids = []
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        result = db.session.execute(stmt)
+        writer.writerow(result.keys())
+        for row in result:
+            writer.writerow([_archive_value(value) for value in row])
+            ids.append(row.id)
+    if not ids:
+        os.remove(path + '.tmp')
+        return 0
+    os.replace(path + '.tmp', path)
+    
+    try:
+        for i in range(0, len(ids), Config.IMPORT_BATCH_SIZE):
+            db.session.execute(
+                delete(model).where(model.id.in_(ids[i:i + Config.IMPORT_BATCH_SIZE]))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(path)
+        raise
+    
+    parts.append({
+        'file': relative, 'rows': len(ids), 'first_id': ids[0], 'last_id': ids[-1],
+        'sha256': file_sha256(path), 'archived_at': datetime.now(timezone.utc).isoformat()
+    })
+    save_archive_manifest(manifest)
+    return len(ids)
+
+def archive_closed_periods(months=None, dry_run=False):
+    """Archiva mes a mes todo lo anterior a archive_cutoff(); devuelve {tabla: {periodo: filas}}"""
+    cutoff = archive_cutoff(months)
+    manifest = load_archive_manifest()
+    summary = {}
+    for table, (model, date_column, _) in ARCHIVE_SOURCES.items():
+        if not dry_run:
+            recover_archive_parts(table, manifest)
+        oldest = db.session.scalar(select(func.min(date_column)).where(date_column < cutoff))
+        start = month_start(oldest) if oldest else cutoff
+        while start < cutoff:
+            rows = archive_period(table, start, manifest, dry_run)
+            if rows:
+                summary.setdefault(table, {})[start.strftime('%Y-%m')] = rows
+            start = next_month(start)
+    return summary
+
+def read_archive_part(path):
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+def iter_archived_rows(table, start=None, end=None, owner_id=None):
+    """Lee bajo demanda las filas archivadas de `table` con fecha en [start, end), solo de las partes que se cruzan"""
+    date_field = ARCHIVE_SOURCES[table][1].key
+    for period, parts in sorted(load_archive_manifest().get(table, {}).items()):
+        period_start = datetime.strptime(period, '%Y-%m')
+        if (end and period_start >= end) or (start and next_month(period_start) <= start):
+            continue
+        for part in parts:
+            for row in read_archive_part(os.path.join(Config.ARCHIVE_DIR, part['file'])):
+                if owner_id is not None and row['owner_id'] != str(owner_id):
+                    continue
+                moment = datetime.fromisoformat(row[date_field])
+                if (start and moment < start) or (end and moment >= end):
+                    continue
+                row[date_field] = moment
+                yield row
+
+# Importación masiva de productos desde CSV o XLSX
+IMPORT_HEADERS = {
+    'name': 'name', 'nombre': 'name', 'producto': 'name',
+    'price_provider': 'price_provider', 'precio_proveedor': 'price_provider',
+    'price_client': 'price_client', 'precio_cliente': 'price_client', 'precio': 'price_client',
+    'stock': 'stock', 'cantidad': 'stock',
+    'category': 'category', 'categoria': 'category',
+    'sku': 'sku', 'codigo': 'sku', 'codigo_de_barras': 'sku', 'barcode': 'sku'
+}
+
+def iter_import_rows(file, filename):
+    """Genera (número de fila, dict) leyendo el archivo en streaming, sin cargarlo completo"""
+    if filename.lower().endswith('.xlsx'):
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None) or []
+            yield from _rows_with_header(header, rows)
+        finally:
+            workbook.close()
+    else:
+        reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        header = next(reader, None) or []
+        yield from _rows_with_header(header, reader)
+
+def _rows_with_header(header, rows):
+    fields = [IMPORT_HEADERS.get(normalize_search_text(str(h or '')).strip().replace(' ', '_')) for h in header]
+    for number, values in enumerate(rows, start=2):
+        if not any(v not in (None, '') for v in values):
+            continue
+        yield number, {field: value for field, value in zip(fields, values) if field}
+
+def _parse_number(value):
+    if isinstance(value, str):
+        value = value.strip().replace(',', '.') if value.count(',') == 1 and '.' not in value else value.strip()
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError('no es un número finito')
+    return number
+
+def validate_import_row(row, owner_id, store_type):
+    """Convierte una fila importada en valores de Product; lanza ValueError si es inválida"""
+    name = str(row.get('name') or '').strip()
+    category = str(row.get('category') or '').strip()
+    if not name or not category:
+        raise ValueError('Nombre y categoría son requeridos')
+    if len(name) > 100 or len(category) > 50:
+        raise ValueError('Nombre o categoría demasiado largos')
+    try:
+        price_provider = _parse_number(row.get('price_provider'))
+        price_client = _parse_number(row.get('price_client'))
+        stock = _parse_number(row.get('stock'))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('Precios y stock deben ser numéricos')
+    if not stock.is_integer():
+        raise ValueError('El stock debe ser un número entero')
+    if stock > 2**31 - 1:
+        raise ValueError('Stock fuera de rango')
+    stock = int(stock)
+    if price_provider < 0 or price_client < 0 or stock < 0:
+        raise ValueError('Precios y stock no pueden ser negativos')
+    sku = row.get('sku')
+    if isinstance(sku, float) and sku.is_integer():
+        sku = int(sku)  # Excel guarda los códigos numéricos como float
+    sku = normalize_code(str(sku)) if sku is not None else ''
+    if len(sku) > 64:
+        raise ValueError('Código de barras demasiado largo')
+    return {
+        'name': name, 'price_provider': price_provider, 'price_client': price_client,
+        'stock': stock, 'category': category, 'store_type': store_type,
+        'user_id': owner_id, 'sku': sku or None, 'created_at': datetime.now(timezone.utc)
+    }
+
+def upsert_products(rows):
+    """Inserta o actualiza (por dueño + código) un bloque de productos con un solo executemany"""
+    with_sku = [row for row in rows if row['sku']]
+    without_sku = [row for row in rows if not row['sku']]
+    if without_sku:
+        db.session.execute(insert(Product.__table__), without_sku)
+    if not with_sku:
+        return
+    
+    updated_columns = ('name', 'price_provider', 'price_client', 'stock', 'category')
+    owner_id = with_sku[0]['user_id']
+    existing = {sku: (product_id, stock) for sku, product_id, stock in db.session.execute(
+        select(Product.sku, Product.id, Product.stock)
+        .where(Product.user_id == owner_id, Product.sku.in_([row['sku'] for row in with_sku]))
+    )}
+    
+    # Los productos existentes cambian su stock al valor del archivo: queda como ajuste en el kardex
+    current = {sku: stock for sku, (_, stock) in existing.items()}
+    adjustments = []
+    for row in with_sku:
+        if row['sku'] in existing and row['stock'] != current[row['sku']]:
+            adjustments.append({
+                'product_id': existing[row['sku']][0], 'kind': 'adjustment',
+                'quantity': row['stock'] - current[row['sku']], 'stock_after': row['stock'],
+                'notes': 'Importación', 'created_at': row['created_at']
+            })
+            current[row['sku']] = row['stock']
+    if adjustments:
+        db.session.execute(insert(StockMovement), adjustments)
+    
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(Product.__table__)
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in updated_columns})
+        db.session.execute(stmt, with_sku)
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(Product.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'sku'],
+            set_={c: stmt.excluded[c] for c in updated_columns}
+        )
+        db.session.execute(stmt, with_sku)
+    else:
+        updates = [dict({c: row[c] for c in updated_columns}, id=existing[row['sku']][0])
+                   for row in with_sku if row['sku'] in existing]
+        inserts = [row for row in with_sku if row['sku'] not in existing]
+        if updates:
+            db.session.execute(update(Product), updates)
+        if inserts:
+            db.session.execute(insert(Product.__table__), inserts)
+
+def import_products(file, filename, owner_id, store_type):
+    """Importa productos en bloques dentro de una transacción; devuelve el reporte"""
+    started = time.perf_counter()
+    imported, errors, batch = 0, [], []
+    try:
+        for number, row in iter_import_rows(file, filename):
+            try:
+                batch.append(validate_import_row(row, owner_id, store_type))
+            except ValueError as e:
+                if len(errors) < Config.IMPORT_MAX_ERRORS:
+                    errors.append({'row': number, 'error': str(e)})
+                continue
+            if len(batch) >= Config.IMPORT_BATCH_SIZE:
+                upsert_products(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            upsert_products(batch)
+            imported += len(batch)
+        if imported:
+            record_opening_balances(owner_id)  # productos nuevos del archivo
+            bump_catalog_version(owner_id, store_type)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(imported / elapsed) if elapsed else imported
+    }
+
+def fulltext_search_stmt(base, tokens, limit):
+    """Select de MySQL sobre el índice FULLTEXT ft_product_search, ordenado por relevancia"""
+    terms = ' '.join(f'+"{token}"' for token in tokens)
+    match = mysql_match(Product.name, Product.category, against=terms).in_boolean_mode()
+    return base.where(match).order_by(match.desc()).limit(limit)
+
+def search_products(owner_id, store_type, query, limit):
+    """Devuelve hasta `limit` productos con stock que coinciden con la consulta"""
+    base = select(*PRODUCT_COLUMNS).where(
+        Product.user_id == owner_id, Product.store_type == store_type, Product.stock > 0
+    )
+    tokens = search_tokens(query)
+    if db.engine.dialect.name == 'mysql' and tokens and all(len(t) >= 2 for t in tokens):
+        return project(fulltext_search_stmt(base, tokens, limit))
+    
+    # Los candidatos salen en orden; se consulta el stock por bloques hasta completar `limit`
+    candidates = get_search_trie(owner_id, store_type).search(query)
+    results = []
+    chunk = max(limit * 4, 50)
+    while len(results) < limit:
+        ids = list(itertools.islice(candidates, chunk))
+        if not ids:
+            break
+        rows = {row['id']: row for row in project(base.where(Product.id.in_(ids)))}
+        results.extend(rows[product_id] for product_id in ids if product_id in rows)
+    return results[:limit]
+
 def get_redirect_url(user):
     """Determina la URL de redirección basada en el rol del usuario"""
     if user.role == 'superadmin':
@@ -199,16 +1624,8 @@ def login():
                 print(f"Contraseña incorrecta para usuario: {username}")
                 return jsonify({'error': 'Contraseña incorrecta'}), 401
             
-            try:
-                if user.is_expired():
-                    user.is_blocked = True
-                    db.session.commit()
-                    print(f"Cuenta expirada para usuario: {username}")
-            except Exception as exp_error:
-                print(f"Error al verificar expiración: {str(exp_error)}")
-                # Continue with login process even if expiration check fails
-            
-            if user.is_blocked:
+            # El bloqueo por vencimiento lo aplica el barrido periódico; aquí solo se compara la fecha
+            if user.is_blocked or user.is_expired():
                 print(f"Cuenta bloqueada para usuario: {username}")
                 return jsonify({'error': 'Usuario bloqueado. Comunícate con el distribuidor para renovar suscripción'}), 401
             
@@ -216,6 +1633,7 @@ def login():
                 session['user_id'] = user.id
                 session['user_role'] = user.role
                 session['store_type'] = user.store_type
+                session['owner_id'] = catalog_owner_id(user)
             except Exception as session_error:
                 print(f"Error al crear sesión: {str(session_error)}")
                 return jsonify({'error': 'Error al iniciar sesión'}), 500
@@ -249,20 +1667,83 @@ def superadmin():
 @app.route('/api/users')
 @role_required('superadmin')
 def get_users():
-    users = User.query.filter(User.role != 'superadmin').all()
-    users_data = []
-    for user in users:
-        users_data.append({
-            'id': user.id,
-            'username': user.username,
-            'name': user.name,
-            'role': user.role,
-            'store_type': user.store_type,
-            'created_at': user.created_at.isoformat(),
-            'is_blocked': user.is_blocked,
-            'is_expired': user.is_expired()
-        })
-    return jsonify(users_data)
+    stmt = select(*USER_COLUMNS, expired_column()).where(User.role != 'superadmin').order_by(User.id)
+    return jsonify(project(stmt))
+
+@app.route('/api/tenants')
+@role_required('superadmin')
+def get_tenants():
+    try:
+        return jsonify(tenant_overview())
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener resumen de tiendas: {str(e)}'}), 500
+
+def tenant_overview(days=30):
+    """Resumen por administrador en una sola consulta: cada métrica es una subconsulta agrupada unida por dueño"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    
+    employees = (
+        select(User.parent_id.label('owner_id'), func.count(User.id).label('employees'))
+        .where(User.role == 'empleado')
+        .group_by(User.parent_id)
+        .subquery()
+    )
+    products = (
+        select(Product.user_id.label('owner_id'), func.count(Product.id).label('products'))
+        .group_by(Product.user_id)
+        .subquery()
+    )
+    sales = (
+        select(
+            Product.user_id.label('owner_id'),
+            func.count(Sale.id).label('sales'),
+            func.sum(Sale.total_price).label('revenue'),
+            func.max(Sale.created_at).label('last_sale')
+        )
+        .join(Product, Sale.product_id == Product.id)
+        .where(Sale.created_at >= since)
+        .group_by(Product.user_id)
+        .subquery()
+    )
+    movements = (
+        select(Product.user_id.label('owner_id'), func.max(StockMovement.created_at).label('last_movement'))
+        .join(Product, StockMovement.product_id == Product.id)
+        .group_by(Product.user_id)
+        .subquery()
+    )
+    credits = (
+        select(Customer.user_id.label('owner_id'), func.sum(Credit.remaining_amount).label('open_credit'))
+        .join(Customer, Credit.customer_id == Customer.id)
+        .where(Credit.status != 'completed')
+        .group_by(Customer.user_id)
+        .subquery()
+    )
+    
+    stmt = (
+        select(
+            User.id, User.username, User.name, User.store_type, User.is_blocked,
+            User.subscription_expires_at, expired_column(),
+            func.coalesce(employees.c.employees, 0).label('employees'),
+            func.coalesce(products.c.products, 0).label('products'),
+            func.coalesce(sales.c.sales, 0).label('sales_30d'),
+            func.coalesce(sales.c.revenue, 0).label('revenue_30d'),
+            func.coalesce(credits.c.open_credit, 0).label('open_credit'),
+            sales.c.last_sale, movements.c.last_movement
+        )
+        .outerjoin(employees, employees.c.owner_id == User.id)
+        .outerjoin(products, products.c.owner_id == User.id)
+        .outerjoin(sales, sales.c.owner_id == User.id)
+        .outerjoin(movements, movements.c.owner_id == User.id)
+        .outerjoin(credits, credits.c.owner_id == User.id)
+        .where(User.role == 'admin')
+        .order_by(User.id)
+    )
+    
+    tenants = project(stmt)
+    for tenant in tenants:
+        activity = [d for d in (tenant.pop('last_sale'), tenant.pop('last_movement')) if d]
+        tenant['last_activity'] = max(activity) if activity else None
+    return tenants
 
 @app.route('/api/users', methods=['POST'])
 @role_required('superadmin')
@@ -279,6 +1760,8 @@ def create_user():
             role=data['role'],
             store_type=data['store_type']
         )
+        if user.role != 'superadmin':
+            user.subscription_expires_at = datetime.now(timezone.utc) + timedelta(days=Config.SUBSCRIPTION_DAYS)
         user.set_password(data['password'])
         
         db.session.add(user)
@@ -303,9 +1786,15 @@ def update_user(user_id):
         
         user.username = data['username']
         user.name = data['name']
-        user.role = data['role']
         user.store_type = data['store_type']
         
+        # La cuenta de superadministrador no vence; al quitarle ese rol empieza un periodo nuevo
+        if data['role'] == 'superadmin':
+            user.subscription_expires_at = None
+        elif user.role == 'superadmin' or user.subscription_expires_at is None:
+            user.subscription_expires_at = datetime.now(timezone.utc) + timedelta(days=Config.SUBSCRIPTION_DAYS)
+        user.role = data['role']
+        
         if data.get('password'):
             user.set_password(data['password'])
         
@@ -327,15 +1816,15 @@ def delete_user(user_id):
             return jsonify({'error': 'No se puede eliminar un superadministrador'}), 400
         
         # Verificar si tiene productos asociados
-        if user.products:
+        if row_exists(select(Product.id).where(Product.user_id == user.id)):
             return jsonify({'error': 'No se puede eliminar el usuario porque tiene productos asociados'}), 400
         
         # Verificar si tiene ventas asociadas
-        if user.sales:
+        if row_exists(select(Sale.id).where(Sale.employee_id == user.id)):
             return jsonify({'error': 'No se puede eliminar el usuario porque tiene ventas asociadas'}), 400
         
         # Verificar si tiene empleados a cargo
-        if user.employees:
+        if row_exists(select(User.id).where(User.parent_id == user.id)):
             return jsonify({'error': 'No se puede eliminar el usuario porque tiene empleados a cargo'}), 400
         
         db.session.delete(user)
@@ -370,25 +1859,70 @@ def toggle_user_block(user_id):
         db.session.rollback()
         return jsonify({'error': f'Error al cambiar estado del usuario: {str(e)}'}), 500
 
+@app.route('/api/users/<int:user_id>/renew', methods=['POST'])
+@role_required('superadmin')
+def renew_user(user_id):
+    try:
+        user = User.query.get_or_404(user_id)
+        if user.role == 'superadmin':
+            return jsonify({'error': 'La cuenta de superadministrador no vence'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        days = int(data.get('days') or Config.SUBSCRIPTION_DAYS)
+        if days <= 0:
+            return jsonify({'error': 'Los días de renovación deben ser mayores a cero'}), 400
+        
+        renew_subscriptions([user.id], days)
+        db.session.refresh(user)
+        return jsonify({
+            'success': True,
+            'message': f'Suscripción renovada por {days} días',
+            'subscription_expires_at': user.subscription_expires_at
+        })
+    
+    except ValueError:
+        return jsonify({'error': 'Número de días inválido'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al renovar suscripción: {str(e)}'}), 500
+
+@app.route('/api/users/bulk', methods=['POST'])
+@role_required('superadmin')
+def bulk_update_users():
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        user_ids = [int(i) for i in data.get('user_ids') or []]
+        if not user_ids:
+            return jsonify({'error': 'No se seleccionaron usuarios'}), 400
+        
+        if action == 'renew':
+            days = int(data.get('days') or Config.SUBSCRIPTION_DAYS)
+            if days <= 0:
+                return jsonify({'error': 'Los días de renovación deben ser mayores a cero'}), 400
+            updated = renew_subscriptions(user_ids, days)
+        elif action in ('block', 'unblock'):
+            updated = set_users_blocked(user_ids, action == 'block')
+        else:
+            return jsonify({'error': 'Acción no válida'}), 400
+        
+        return jsonify({'success': True, 'updated': updated, 'message': f'{updated} usuarios actualizados'})
+    
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Datos inválidos'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al actualizar usuarios: {str(e)}'}), 500
+
 @app.route('/api/employees')
 @role_required('admin')
 def get_employees():
     try:
         admin_user = User.query.get(session['user_id'])
-        employees = User.query.filter_by(role='empleado', parent_id=admin_user.id, store_type=admin_user.store_type).all()
-        
-        employees_data = []
-        for employee in employees:
-            employees_data.append({
-                'id': employee.id,
-                'username': employee.username,
-                'name': employee.name,
-                'store_type': employee.store_type,
-                'created_at': employee.created_at.isoformat(),
-                'is_blocked': employee.is_blocked,
-                'is_expired': employee.is_expired()
-            })
-        return jsonify(employees_data)
+        stmt = select(*USER_COLUMNS, expired_column()).where(
+            User.role == 'empleado', User.parent_id == admin_user.id, User.store_type == admin_user.store_type
+        ).order_by(User.id)
+        return jsonify(project(stmt))
     
     except Exception as e:
         return jsonify({'error': f'Error al obtener empleados: {str(e)}'}), 500
@@ -408,7 +1942,8 @@ def create_employee():
             name=data['name'],
             role='empleado',
             store_type=admin_user.store_type,
-            parent_id=admin_user.id
+            parent_id=admin_user.id,
+            subscription_expires_at=admin_user.subscription_expires_at
         )
         employee.set_password(data['password'])
         
@@ -462,7 +1997,7 @@ def delete_employee(employee_id):
             return jsonify({'error': 'Empleado no encontrado o no tienes permisos'}), 404
         
         # Verificar si tiene ventas asociadas
-        if employee.sales:
+        if row_exists(select(Sale.id).where(Sale.employee_id == employee.id)):
             return jsonify({'error': 'No se puede eliminar el empleado porque tiene ventas asociadas'}), 400
         
         db.session.delete(employee)
@@ -512,29 +2047,69 @@ def get_products(store_type):
     try:
         user = User.query.get(session['user_id'])
         
-        if user.role == 'empleado' and user.parent_id:
-            # Los empleados ven los productos de su administrador
-            admin_user = User.query.get(user.parent_id)
-            products = Product.query.filter_by(store_type=store_type, user_id=admin_user.id).all()
-        else:
-            # Los administradores ven sus propios productos
-            products = Product.query.filter_by(store_type=store_type, user_id=user.id).all()
+        # Los empleados ven los productos de su administrador
+        owner_id = catalog_owner_id(user)
         
-        products_data = []
-        for product in products:
-            products_data.append({
-                'id': product.id,
-                'name': product.name,
-                'price_provider': product.price_provider,
-                'price_client': product.price_client,
-                'stock': product.stock,
-                'category': product.category
-            })
+        products_data = project(
+            select(*PRODUCT_COLUMNS).where(Product.store_type == store_type, Product.user_id == owner_id)
+        )
         return jsonify(products_data)
     
     except Exception as e:
         return jsonify({'error': f'Error al obtener productos: {str(e)}'}), 500
 
+@app.route('/api/products/<store_type>/catalog')
+@login_required
+def get_product_catalog(store_type):
+    """Catálogo completo si la versión del cliente no coincide; si coincide, solo el delta de stock"""
+    try:
+        # Solo la tienda del usuario: otro valor crearía entradas de caché que desalojan las reales
+        if store_type != session.get('store_type'):
+            return jsonify({'error': 'Tienda no válida para este usuario'}), 403
+        
+        owner_id = session.get('owner_id')
+        if owner_id is None:
+            owner_id = session['owner_id'] = catalog_owner_id(db.session.get(User, session['user_id']))
+        
+        client_version = request.args.get('version', type=int)
+        client_cursor = request.args.get('cursor', 0, type=int)
+        
+        version, cursor, blob = get_catalog_blob(owner_id, store_type)
+        if client_version == version:
+            blob = b'null'
+            cursor = client_cursor
+        new_cursor, stock = catalog_stock_delta(owner_id, store_type, cursor)
+        
+        # El blob ya está serializado: se arma la respuesta sin volver a procesarlo
+        body = b'{"version":%d,"cursor":%d,"catalog":%s,"stock":%s}' % (
+            version, new_cursor, blob, app.json.dumps(stock).encode('utf-8')
+        )
+        return Response(body, mimetype='application/json')
+    
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener catálogo: {str(e)}'}), 500
+
+@app.route('/api/products/<store_type>/search')
+@login_required
+def search_products_endpoint(store_type):
+    try:
+        # Solo la tienda del usuario: otro valor crearía tries que desalojan los reales
+        if store_type != session.get('store_type'):
+            return jsonify({'error': 'Tienda no válida para este usuario'}), 403
+        
+        query = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        if not query:
+            return jsonify([])
+        
+        owner_id = session.get('owner_id')
+        if owner_id is None:
+            owner_id = session['owner_id'] = catalog_owner_id(db.session.get(User, session['user_id']))
+        return jsonify(search_products(owner_id, store_type, query, limit))
+    
+    except Exception as e:
+        return jsonify({'error': f'Error al buscar productos: {str(e)}'}), 500
+
 @app.route('/api/products', methods=['POST'])
 @role_required('admin')
 def create_product():
@@ -545,6 +2120,10 @@ def create_product():
         if not all(key in data for key in ['name', 'price_provider', 'price_client', 'stock', 'category']):
             return jsonify({'error': 'Faltan campos requeridos'}), 400
         
+        sku = normalize_code(data.get('sku')) or None
+        if sku and Product.query.filter_by(user_id=user.id, sku=sku).first():
+            return jsonify({'error': 'El código de barras ya está asignado a otro producto'}), 400
+        
         product = Product(
             name=data['name'],
             price_provider=float(data['price_provider']),
@@ -552,10 +2131,15 @@ def create_product():
             stock=int(data['stock']),
             category=data['category'],
             store_type=user.store_type,
-            user_id=user.id
+            user_id=user.id,
+            sku=sku
         )
         
         db.session.add(product)
+        db.session.flush()
+        record_stock_movement(product.id, 'restock', product.stock, product.stock, user_id=user.id,
+                              notes='Stock inicial')
+        bump_catalog_version(user.id, user.store_type)
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Producto creado exitosamente'})
@@ -564,31 +2148,119 @@ def create_product():
         db.session.rollback()
         return jsonify({'error': f'Error al crear producto: {str(e)}'}), 500
 
+@app.route('/api/products/import', methods=['POST'])
+@role_required('admin')
+def import_products_endpoint():
+    try:
+        user = db.session.get(User, session['user_id'])
+        upload = request.files.get('file')
+        if not upload or not upload.filename.lower().endswith(('.csv', '.xlsx')):
+            return jsonify({'error': 'Adjunta un archivo .csv o .xlsx'}), 400
+        
+        report = import_products(upload.stream, upload.filename, user.id, user.store_type)
+        return jsonify(dict(report, success=True))
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al importar productos: {str(e)}'}), 500
+
+@app.route('/api/products/<int:product_id>/stock', methods=['POST'])
+@role_required('admin')
+def adjust_stock(product_id):
+    """Reposición, devolución o ajuste manual de stock, registrado en el kardex"""
+    try:
+        data = request.get_json() or {}
+        user = db.session.get(User, session['user_id'])
+        kind = data.get('kind')
+        quantity = data.get('quantity')
+        
+        if kind not in ('restock', 'adjustment', 'return') or not isinstance(quantity, int) or quantity == 0:
+            return jsonify({'error': 'Tipo de movimiento o cantidad inválidos'}), 400
+        if kind in ('restock', 'return') and quantity < 0:
+            return jsonify({'error': 'La cantidad de una reposición o devolución debe ser positiva'}), 400
+        
+        product = Product.query.filter_by(id=product_id, user_id=user.id).with_for_update().first()
+        if not product:
+            return jsonify({'error': 'Producto no encontrado'}), 404
+        if product.stock + quantity < 0:
+            return jsonify({'error': 'El ajuste deja el stock en negativo'}), 400
+        
+        product.stock += quantity
+        record_stock_movement(product.id, kind, quantity, product.stock, sale_id=data.get('sale_id'),
+                              user_id=user.id, notes=(data.get('notes') or '')[:200])
+        db.session.commit()
+        
+        return jsonify({'success': True, 'message': 'Stock actualizado exitosamente', 'stock': product.stock})
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error al actualizar stock: {str(e)}'}), 500
+
+@app.route('/api/products/<int:product_id>/movements')
+@role_required('admin')
+def get_stock_movements(product_id):
+    user = db.session.get(User, session['user_id'])
+    if not Product.query.filter_by(id=product_id, user_id=user.id).first():
+        return jsonify({'error': 'Producto no encontrado'}), 404
+    
+    movements = project(
+        select(StockMovement.id, StockMovement.kind, StockMovement.quantity, StockMovement.stock_after,
+               StockMovement.sale_id, StockMovement.notes, StockMovement.created_at)
+        .where(StockMovement.product_id == product_id)
+        .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        .limit(request.args.get('limit', 200, type=int))
+    )
+    return jsonify(movements)
+
+@app.route('/api/inventory/<store_type>')
+@role_required('admin')
+def inventory_at(store_type):
+    """Stock y valorización (a precio de proveedor actual) en una fecha, p. ej. un cierre de mes"""
+    try:
+        user = db.session.get(User, session['user_id'])
+        at = request.args.get('date')
+        at = datetime.fromisoformat(at) if at else datetime.now(timezone.utc)
+        if len(request.args.get('date', '')) == 10:
+            at = at + timedelta(days=1) - timedelta(microseconds=1)  # fin del día indicado
+        
+        stock = ledger_stock_at(at, owner_id=user.id)
+        products = project(
+            select(Product.id, Product.name, Product.category, Product.price_provider)
+            .where(Product.user_id == user.id, Product.store_type == store_type)
+        )
+        for product in products:
+            product['stock'] = stock.get(product['id'], 0)
+            product['valuation'] = product['stock'] * product['price_provider']
+        
+        return jsonify({
+            'date': at.isoformat(),
+            'products': products,
+            'total_units': sum(p['stock'] for p in products),
+            'total_valuation': sum(p['valuation'] for p in products)
+        })
+    
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida, usa el formato AAAA-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error al calcular inventario: {str(e)}'}), 500
+
 @app.route('/api/sales/<store_type>')
 @login_required
 def get_sales(store_type):
     try:
         user = User.query.get(session['user_id'])
         
+        stmt = (
+            select(*SALE_COLUMNS)
+            .join(Product, Sale.product_id == Product.id)
+            .join(User, Sale.employee_id == User.id)
+        )
         if user.role == 'admin':
-            user_products = Product.query.filter_by(user_id=user.id).all()
-            product_ids = [p.id for p in user_products]
-            sales = Sale.query.filter(Sale.product_id.in_(product_ids)).all()
+            stmt = stmt.where(Product.user_id == user.id)
         else:
-            sales = Sale.query.filter_by(employee_id=user.id).all()
-        
-        sales_data = []
-        for sale in sales:
-            sales_data.append({
-                'id': sale.id,
-                'product_name': sale.product.name,
-                'quantity': sale.quantity,
-                'total_price': sale.total_price,
-                'customer_name': sale.customer_name,
-                'employee_name': sale.employee.name,
-                'payment_type': sale.payment_type,
-                'created_at': sale.created_at.isoformat()
-            })
+            stmt = stmt.where(Sale.employee_id == user.id)
+        
+        sales_data = project(stmt)
         return jsonify(sales_data)
     
     except Exception as e:
@@ -597,18 +2269,32 @@ def get_sales(store_type):
 @app.route('/api/sales', methods=['POST'])
 @login_required
 def create_sale():
+    return record_sale(request.get_json())
+
+def record_sale(data):
+    """Registra una venta de contado para el usuario en sesión (usado por /api/sales y el escáner)"""
     try:
-        data = request.get_json()
         user = db.session.get(User, session['user_id'])
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 400
         
+        # Venta ya registrada con la misma clave de la terminal (reintento tras perder la respuesta)
+        client_key = data.get('client_key')
+        if client_key:
+            existing_id = db.session.execute(select(Sale.id).where(Sale.client_key == client_key)).scalar()
+            if existing_id:
+                return jsonify({'success': True, 'message': 'Venta registrada exitosamente', 'sale_id': existing_id})
+        
+        if not valid_quantity(data.get('quantity')):
+            return jsonify({'error': 'Cantidad inválida'}), 400
+        
+        # Se bloquea la fila del producto para que dos ventas simultáneas no descuenten sobre el mismo stock
         if user.role == 'empleado' and user.parent_id:
             admin_user = User.query.get(user.parent_id)
-            product = Product.query.filter_by(id=data['product_id'], user_id=admin_user.id).first()
+            product = Product.query.filter_by(id=data['product_id'], user_id=admin_user.id).with_for_update().first()
         else:
-            product = Product.query.filter_by(id=data['product_id'], user_id=user.id).first()
+            product = Product.query.filter_by(id=data['product_id'], user_id=user.id).with_for_update().first()
         
         if not product:
             return jsonify({'error': 'Producto no encontrado o no tienes permisos para venderlo'}), 400
@@ -629,13 +2315,19 @@ def create_sale():
             customer_name=customer_name,
             customer_phone=customer_phone,
             payment_type=payment_type,
-            employee_id=user.id
+            employee_id=user.id,
+            client_key=client_key,
+            customer_id=resolve_customer_id(product.user_id, customer_phone, customer_name)
         )
         
         product.stock -= data['quantity']
         
         db.session.add(sale)
+        db.session.flush()
+        record_stock_movement(product.id, 'sale', -data['quantity'], product.stock, sale_id=sale.id, user_id=user.id)
+        enqueue_job('sale.created', {'sale_id': sale.id})
         db.session.commit()
+        notify_outbox()
         
         return jsonify({'success': True, 'message': 'Venta registrada exitosamente', 'sale_id': sale.id})
     
@@ -644,29 +2336,257 @@ def create_sale():
         print(f"Error en create_sale: {str(e)}")
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@app.route('/api/products/by-code/<path:code>')
+@login_required
+def get_product_by_code(code):
+    try:
+        user = db.session.get(User, session['user_id'])
+        product_id = find_product_id_by_code(catalog_owner_id(user), user.store_type, code)
+        if not product_id:
+            return jsonify({'error': 'No hay un producto con ese código'}), 404
+        
+        product_data = project(select(*PRODUCT_COLUMNS).where(Product.id == product_id))
+        return jsonify(product_data[0])
+    
+    except Exception as e:
+        return jsonify({'error': f'Error al buscar producto: {str(e)}'}), 500
+
+@app.route('/api/sales/scan', methods=['POST'])
+@login_required
+def scan_sale():
+    """Vende un producto a partir de su código de barras en una sola petición"""
+    data = request.get_json() or {}
+    user = db.session.get(User, session['user_id'])
+    product_id = find_product_id_by_code(catalog_owner_id(user), user.store_type, data.get('code'))
+    if not product_id:
+        return jsonify({'error': 'No hay un producto con ese código'}), 404
+    
+    data['product_id'] = product_id
+    data.setdefault('quantity', 1)
+    return record_sale(data)
+
+def valid_quantity(quantity):
+    """Cantidad vendida válida: entero mayor a cero (un booleano no cuenta como entero)"""
+    return isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+
+@app.route('/api/sync/sales', methods=['POST'])
+@login_required
+def sync_sales():
+    """Aplica en una sola transacción un lote de ventas hechas sin conexión.
+    
+    Cada línea trae un `client_key` generado en la terminal; las líneas ya aplicadas
+    se reportan como duplicadas, así que el cliente puede reenviar el lote sin riesgo.
+    """
+    try:
+        data = request.get_json() or {}
+        lines = data.get('sales') or []
+        user = db.session.get(User, session['user_id'])
+        owner_id = catalog_owner_id(user)
+        
+        if not isinstance(lines, list) or len(lines) > Config.SYNC_MAX_BATCH:
+            return jsonify({'error': f'Se esperaba una lista de hasta {Config.SYNC_MAX_BATCH} ventas'}), 400
+        if not all(isinstance(line, dict) for line in lines):
+            return jsonify({'error': 'Cada venta debe ser un objeto JSON'}), 400
+        
+        keys = [str(line.get('client_key') or '') for line in lines]
+        existing = dict(db.session.execute(
+            select(Sale.client_key, Sale.id).where(Sale.client_key.in_([k for k in keys if k]))
+        ).all())
+        
+        def line_product_id(line):
+            product_id = line.get('product_id')
+            return product_id if isinstance(product_id, int) and not isinstance(product_id, bool) else None
+        
+        product_ids = {line_product_id(line) for line in lines} - {None}
+        products = {
+            row.id: row for row in db.session.execute(
+                select(Product.id, Product.name, Product.price_client, Product.stock)
+                .where(Product.id.in_(product_ids), Product.user_id == owner_id)
+                .with_for_update()
+            )
+        }
+        stock = {pid: row.stock for pid, row in products.items()}
+        
+        now = datetime.now(timezone.utc)
+        results, accepted, seen = [], [], set()
+        for key, line in zip(keys, lines):
+            result = {'client_key': key}
+            results.append(result)
+            if not key or len(key) > 64:
+                result.update(status='error', error='client_key inválido')
+                continue
+            if key in existing or key in seen:
+                result.update(status='duplicate', sale_id=existing.get(key))
+                continue
+            product = products.get(line_product_id(line))
+            quantity = line.get('quantity')
+            if not product:
+                result.update(status='error', error='Producto no encontrado o no tienes permisos para venderlo')
+                continue
+            if not valid_quantity(quantity):
+                result.update(status='error', error='Cantidad inválida')
+                continue
+            if stock[product.id] < quantity:
+                result.update(status='error', error='Stock insuficiente')
+                continue
+            
+            seen.add(key)
+            stock[product.id] -= quantity
+            result['status'] = 'created'
+            accepted.append((key, line, product, quantity, stock[product.id]))
+        
+        # Solo se crean clientes para las líneas que se van a registrar
+        customer_ids = resolve_customer_ids(owner_id, [
+            {'phone': line.get('customer_phone'), 'name': line.get('customer_name'),
+             'address': line.get('customer_address')}
+            for _, line, _, _, _ in accepted
+        ])
+        sale_rows, credit_rows, movement_rows, decrements = [], [], [], {}
+        for key, line, product, quantity, stock_after in accepted:
+            decrements[product.id] = decrements.get(product.id, 0) + quantity
+            movement_rows.append({
+                'client_key': key, 'product_id': product.id, 'kind': 'sale', 'quantity': -quantity,
+                'stock_after': stock_after, 'user_id': user.id, 'created_at': now
+            })
+            try:
+                created_at = datetime.fromisoformat(line['created_at']) if line.get('created_at') else now
+            except (TypeError, ValueError):
+                created_at = now
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(timezone.utc)
+            total = product.price_client * quantity
+            payment_type = line.get('payment_type', 'cash')
+            customer_id = customer_ids.get(normalize_phone(line.get('customer_phone')))
+            sale_rows.append({
+                'product_id': product.id,
+                'product_name': product.name,
+                'quantity': quantity,
+                'total_price': total,
+                'customer_name': line.get('customer_name') or 'Cliente',
+                'customer_phone': line.get('customer_phone', ''),
+                'payment_type': payment_type,
+                'employee_id': user.id,
+                'client_key': key,
+                'customer_id': customer_id,
+                'created_at': created_at
+            })
+            if payment_type == 'credit' and user.store_type == 'muebles':
+                installments = line.get('installments', 6)
+                installments = min(max(installments, 2), 6) if isinstance(installments, int) else 6
+                credit_rows.append({
+                    'customer_name': line.get('customer_name') or 'Cliente',
+                    'customer_phone': line.get('customer_phone', ''),
+                    'customer_address': line.get('customer_address', ''),
+                    'product_name': product.name,
+                    'total_amount': total,
+                    'paid_amount': 0,
+                    'remaining_amount': total,
+                    'installments': installments,
+                    'installment_amount': total / installments,
+                    'next_payment_date': now + timedelta(days=30),
+                    'status': 'active',
+                    'store_type': 'muebles',
+                    'customer_id': customer_id,
+                    'created_at': created_at
+                })
+        
+        if sale_rows:
+            product_table = Product.__table__
+            db.session.execute(
+                product_table.update()
+                .where(product_table.c.id == bindparam('b_id'))
+                .values(stock=product_table.c.stock - bindparam('b_quantity')),
+                [{'b_id': pid, 'b_quantity': qty} for pid, qty in decrements.items()]
+            )
+            db.session.execute(insert(Sale), sale_rows)
+            if credit_rows:
+                db.session.execute(insert(Credit), credit_rows)
+            
+            created = dict(db.session.execute(
+                select(Sale.client_key, Sale.id).where(Sale.client_key.in_(list(seen)))
+            ).all())
+            db.session.execute(insert(OutboxJob), [
+                {'kind': 'sale.created', 'payload': json.dumps({'sale_id': sale_id}), 'status': 'pending',
+                 'attempts': 0, 'run_after': now, 'created_at': now}
+                for sale_id in created.values()
+            ])
+            db.session.execute(insert(StockMovement), [
+                dict({k: v for k, v in row.items() if k != 'client_key'}, sale_id=created[row['client_key']])
+                for row in movement_rows
+            ])
+            for result in results:
+                if result['status'] != 'error' and result['client_key'] in created:
+                    result['sale_id'] = created[result['client_key']]
+        
+        db.session.commit()
+        if sale_rows:
+            notify_outbox()
+        
+        return jsonify({'success': True, 'results': results})
+    
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en sync_sales: {str(e)}")
+        return jsonify({'error': f'Error al sincronizar ventas: {str(e)}'}), 500
+
+@app.route('/api/customers/search')
+@login_required
+def search_customers():
+    """Autocompletado de clientes por prefijo de teléfono (o de nombre) para la caja"""
+    try:
+        user = db.session.get(User, session['user_id'])
+        owner_id = catalog_owner_id(user)
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify([])
+        
+        stmt = select(Customer.id, Customer.name, Customer.phone, Customer.address).where(Customer.user_id == owner_id)
+        if re.fullmatch(r'[\d\s()+-]+', query):
+            stmt = stmt.where(Customer.phone.startswith(normalize_phone(query), autoescape=True)).order_by(Customer.phone)
+        else:
+            stmt = stmt.where(Customer.name.startswith(query, autoescape=True)).order_by(Customer.name)
+        return jsonify(project(stmt.limit(10)))
+    
+    except Exception as e:
+        return jsonify({'error': f'Error al buscar clientes: {str(e)}'}), 500
+
+@app.route('/api/customers/<int:customer_id>/history')
+@login_required
+def customer_history(customer_id):
+    try:
+        user = db.session.get(User, session['user_id'])
+        customer = Customer.query.filter_by(id=customer_id, user_id=catalog_owner_id(user)).first()
+        if not customer:
+            return jsonify({'error': 'Cliente no encontrado'}), 404
+        
+        purchases = project(
+            select(Sale.id, Sale.product_name, Sale.quantity, Sale.total_price, Sale.payment_type, Sale.created_at)
+            .where(Sale.customer_id == customer.id)
+            .order_by(Sale.created_at.desc())
+            .limit(request.args.get('limit', 100, type=int))
+        )
+        open_credits = project(
+            select(*CREDIT_COLUMNS)
+            .where(Credit.customer_id == customer.id, Credit.status != 'completed')
+            .order_by(Credit.next_payment_date)
+        )
+        return jsonify({
+            'customer': {'id': customer.id, 'name': customer.name, 'phone': customer.phone, 'address': customer.address},
+            'purchases': purchases,
+            'open_credits': open_credits,
+            'balance': sum(credit['remaining_amount'] for credit in open_credits)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener historial del cliente: {str(e)}'}), 500
+
 @app.route('/api/credits/<store_type>')
 @role_required('admin')
 def get_credits(store_type):
     if store_type != 'muebles':
         return jsonify([])
     
-    credits = Credit.query.filter_by(store_type=store_type).all()
-    credits_data = []
-    for credit in credits:
-        credits_data.append({
-            'id': credit.id,
-            'customer_name': credit.customer_name,
-            'customer_phone': credit.customer_phone,
-            'customer_address': credit.customer_address,
-            'product_name': credit.product_name,
-            'total_amount': credit.total_amount,
-            'paid_amount': credit.paid_amount,
-            'remaining_amount': credit.remaining_amount,
-            'installment_amount': credit.installment_amount,
-            'next_payment_date': credit.next_payment_date.isoformat(),
-            'status': credit.status,
-            'created_at': credit.created_at.isoformat()
-        })
+    credits_data = project(select(*CREDIT_COLUMNS).where(Credit.store_type == store_type))
     return jsonify(credits_data)
 
 @app.route('/api/credits/<int:credit_id>/payment', methods=['POST'])
@@ -707,7 +2627,7 @@ def empleado(store_type):
     user = User.query.get(session['user_id'])
     if user.store_type != store_type:
         return redirect(url_for('index'))
-    return render_template('empleado.html', store_type=store_type)
+    return render_template('empleado.html', store_type=store_type, sync_max_batch=Config.SYNC_MAX_BATCH)
 
 @app.route('/api/ticket/<int:sale_id>')
 @login_required
@@ -747,34 +2667,60 @@ def generate_ticket(sale_id):
 @app.route('/api/export-sales/<store_type>')
 @role_required('admin')
 def export_sales(store_type):
-    user = User.query.get(session['user_id'])
-    user_products = Product.query.filter_by(user_id=user.id).all()
-    product_ids = [p.id for p in user_products]
-    sales = Sale.query.filter(Sale.product_id.in_(product_ids)).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['Fecha', 'Producto', 'Cantidad', 'Precio Unit.', 'Total', 'Cliente', 'Empleado'])
-    
-    for sale in sales:
-        writer.writerow([
-            sale.created_at.strftime('%d/%m/%Y %H:%M UTC'),
-            sale.product.name,
-            sale.quantity,
-            sale.product.price_client,
-            sale.total_price,
-            sale.customer_name,
-            sale.employee.name
-        ])
+    user_id = session['user_id']
+    try:
+        # Rango opcional ?from=YYYY-MM-DD&to=YYYY-MM-DD (ambos inclusive)
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = datetime.fromisoformat(request.args['to']) + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida, use el formato AAAA-MM-DD'}), 400
     
-    output.seek(0)
+    stmt = (
+        select(Sale.created_at, Product.name, Sale.quantity, Product.price_client,
+               Sale.total_price, Sale.customer_name, User.name)
+        .join(Product, Sale.product_id == Product.id)
+        .join(User, Sale.employee_id == User.id)
+        .where(Product.user_id == user_id)
+        .execution_options(yield_per=1000)
+    )
+    if start:
+        stmt = stmt.where(Sale.created_at >= start)
+    if end:
+        stmt = stmt.where(Sale.created_at < end)
     
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        as_attachment=True,
-        download_name=f'ventas-{store_type}-{datetime.now(timezone.utc).strftime("%Y%m%d")}.csv',
-        mimetype='text/csv'
+    def sale_rows():
+        # Los meses archivados se leen de los CSV comprimidos solo si el rango los incluye
+        for row in iter_archived_rows('sale', start, end, owner_id=user_id):
+            yield (row['created_at'], row['product_name'], row['quantity'], row['unit_price'],
+                   row['total_price'], row['customer_name'], row['employee_name'])
+        yield from db.session.execute(stmt)
+    
+    def generate():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Fecha', 'Producto', 'Cantidad', 'Precio Unit.', 'Total', 'Cliente', 'Empleado'])
+        
+        for created_at, product_name, quantity, price_client, total_price, customer_name, employee_name in sale_rows():
+            writer.writerow([
+                created_at.strftime('%d/%m/%Y %H:%M UTC'),
+                product_name,
+                quantity,
+                price_client,
+                total_price,
+                customer_name,
+                employee_name
+            ])
+            if output.tell() > 64 * 1024:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+    
+    filename = f'ventas-{store_type}-{datetime.now(timezone.utc).strftime("%Y%m%d")}.csv'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
 @app.route('/add_sale', methods=['POST'])
@@ -790,11 +2736,15 @@ def add_sale():
         payment_type = data.get('payment_type', 'cash')
         customer_address = data.get('customer_address', '')
         
-        product = Product.query.get(product_id)
+        if not valid_quantity(quantity):
+            return jsonify({'error': 'Cantidad inválida'}), 400
+        
+        product = Product.query.filter_by(id=product_id).with_for_update().first()
         if not product or product.stock < quantity:
             return jsonify({'error': 'Producto no disponible o stock insuficiente'}), 400
         
         total = product.price_client * quantity
+        customer_id = resolve_customer_id(product.user_id, customer_phone, customer_name, customer_address)
         
         sale = Sale(
             product_id=product.id,
@@ -804,7 +2754,8 @@ def add_sale():
             customer_name=customer_name,
             customer_phone=customer_phone,
             payment_type=payment_type,
-            employee_id=session['user_id']
+            employee_id=session['user_id'],
+            customer_id=customer_id
         )
         
         product.stock -= quantity
@@ -831,11 +2782,17 @@ def add_sale():
                 installments=installments,
                 installment_amount=installment_amount,
                 next_payment_date=datetime.now(timezone.utc) + timedelta(days=30),
-                store_type='muebles'
+                store_type='muebles',
+                customer_id=customer_id
             )
             db.session.add(credit)
         
+        db.session.flush()
+        record_stock_movement(product.id, 'sale', -quantity, product.stock, sale_id=sale.id,
+                              user_id=session['user_id'])
+        enqueue_job('sale.created', {'sale_id': sale.id})
         db.session.commit()
+        notify_outbox()
         
         return jsonify({'success': True, 'message': 'Venta registrada exitosamente', 'sale_id': sale.id})
         
@@ -878,5 +2835,146 @@ def add_credit_payment():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('worker')
+def worker_command():
+    """Procesa la cola de tareas en primer plano (alternativa a los hilos del servidor)"""
+    print("Worker de la cola iniciado")
+    try:
+        outbox_loop()
+    except KeyboardInterrupt:
+        print("Worker detenido")
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--owner', required=True, help='Usuario administrador dueño de los productos')
+def import_products_command(path, owner):
+    """Importa productos desde un archivo CSV o XLSX"""
+    user = User.query.filter_by(username=owner, role='admin').first()
+    if not user:
+        raise click.ClickException(f"No existe el administrador '{owner}'")
+    with open(path, 'rb') as f:
+        report = import_products(f, path, user.id, user.store_type)
+    for error in report['errors']:
+        print(f"Fila {error['row']}: {error['error']}")
+    print(f"Productos importados: {report['imported']} en {report['seconds']} s "
+          f"({report['rows_per_second']} filas/s), filas con error: {len(report['errors'])}")
+
+@app.cli.command('backfill-customers')
+def backfill_customers_command():
+    """Crea clientes a partir de los datos copiados en ventas y créditos y los enlaza"""
+    def link(model, pairs):
+        # UPDATE por clave primaria en lotes (executemany), sin una sentencia por fila
+        for i in range(0, len(pairs), Config.IMPORT_BATCH_SIZE):
+            db.session.execute(update(model), pairs[i:i + Config.IMPORT_BATCH_SIZE])
+        return len(pairs)
+    
+    # Ventas: el dueño es el administrador del producto vendido; el nombre más reciente gana
+    by_owner = {}
+    for owner_id, sale_id, phone, name in db.session.execute(
+        select(Product.user_id, Sale.id, Sale.customer_phone, Sale.customer_name)
+        .join(Product, Sale.product_id == Product.id)
+        .where(Sale.customer_id.is_(None), Sale.customer_phone != '')
+        .order_by(Sale.created_at.desc())
+    ):
+        by_owner.setdefault(owner_id, []).append((sale_id, phone, name))
+    
+    linked_sales = 0
+    for owner_id, sales in by_owner.items():
+        ids = resolve_customer_ids(owner_id, [{'phone': phone, 'name': name} for _, phone, name in sales])
+        linked_sales += link(Sale, [
+            {'id': sale_id, 'customer_id': ids[normalize_phone(phone)]}
+            for sale_id, phone, _ in sales if normalize_phone(phone) in ids
+        ])
+    
+    # Créditos: no guardan dueño; se enlazan si las ventas con el mismo teléfono y producto
+    # pertenecen a un único administrador
+    owners = {
+        (phone, product_name): owner_id
+        for phone, product_name, owner_id in db.session.execute(
+            select(Sale.customer_phone, Sale.product_name, func.min(Product.user_id))
+            .join(Product, Sale.product_id == Product.id)
+            .where(Sale.customer_phone != '')
+            .group_by(Sale.customer_phone, Sale.product_name)
+            .having(func.count(Product.user_id.distinct()) == 1)
+        )
+    }
+    credits_by_owner = {}
+    for credit_id, phone, name, address, product_name in db.session.execute(
+        select(Credit.id, Credit.customer_phone, Credit.customer_name, Credit.customer_address, Credit.product_name)
+        .where(Credit.customer_id.is_(None), Credit.customer_phone != '')
+    ):
+        owner_id = owners.get((phone, product_name))
+        if owner_id is not None:
+            credits_by_owner.setdefault(owner_id, []).append((credit_id, phone, name, address))
+    
+    linked_credits = 0
+    for owner_id, credits in credits_by_owner.items():
+        ids = resolve_customer_ids(owner_id, [
+            {'phone': phone, 'name': name, 'address': address} for _, phone, name, address in credits
+        ])
+        linked_credits += link(Credit, [
+            {'id': credit_id, 'customer_id': ids[normalize_phone(phone)]}
+            for credit_id, phone, _, _ in credits if normalize_phone(phone) in ids
+        ])
+    
+    db.session.commit()
+    print(f"Clientes enlazados: {linked_sales} ventas y {linked_credits} créditos")
+
+@app.cli.command('snapshot-stock')
+def snapshot_stock_command():
+    """Guarda una foto del stock de todos los productos (programar, p. ej., cada noche)"""
+    print(f"Fotos de stock guardadas: {take_stock_snapshot()}")
+
+@app.cli.command('reconcile-stock')
+@click.option('--fix', is_flag=True, help='Registra ajustes para que el kardex coincida con Product.stock')
+def reconcile_stock_command(fix):
+    """Compara el stock según el kardex con Product.stock"""
+    opened = record_opening_balances()
+    if opened:
+        print(f"Saldos iniciales registrados para {opened} productos sin movimientos")
+    
+    ledger = ledger_stock_at(datetime.now(timezone.utc) + timedelta(seconds=1))
+    mismatches = 0
+    for product_id, name, stock in db.session.execute(select(Product.id, Product.name, Product.stock)):
+        expected = ledger.get(product_id, 0)
+        if expected == stock:
+            continue
+        mismatches += 1
+        print(f"Producto {product_id} ({name}): kardex {expected}, stock {stock}")
+        if fix:
+            record_stock_movement(product_id, 'adjustment', stock - expected, stock, notes='Conciliación')
+    
+    db.session.commit()
+    print(f"Productos con diferencias: {mismatches}" + (" (ajustados)" if fix and mismatches else ""))
+    if mismatches and not fix:
+        raise SystemExit(1)
+
+@app.cli.command('purge-outbox')
+def purge_outbox_command():
+    """Borra los trabajos terminados de la cola más antiguos que OUTBOX_RETENTION_DAYS"""
+    print(f"Trabajos terminados eliminados: {purge_outbox_jobs()}")
+
+@app.cli.command('purge-idempotency')
+def purge_idempotency_command():
+    """Borra las claves de idempotencia más antiguas que IDEMPOTENCY_TTL_HOURS"""
+    print(f"Claves de idempotencia eliminadas: {purge_idempotency_keys()}")
+
+@app.cli.command('archive-sales')
+@click.option('--months', type=int, default=None, help='Meses a conservar (por defecto ARCHIVE_RETENTION_MONTHS)')
+@click.option('--dry-run', is_flag=True, help='Solo muestra cuántas filas se archivarían')
+def archive_sales_command(months, dry_run):
+    """Mueve las ventas y abonos de meses cerrados a archivos CSV comprimidos en ARCHIVE_DIR"""
+    summary = archive_closed_periods(months, dry_run)
+    if not summary:
+        print("No hay periodos cerrados para archivar")
+    for table, periods in summary.items():
+        for period, rows in periods.items():
+            print(f"{table} {period}: {rows} filas{' (simulación)' if dry_run else ' archivadas'}")
+
+@app.cli.command('sweep-subscriptions')
+def sweep_subscriptions_command():
+    """Bloquea las cuentas cuya suscripción ya venció"""
+    print(f"Cuentas bloqueadas por vencimiento: {sweep_expired_subscriptions()}")
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0")
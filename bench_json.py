@@ -0,0 +1,104 @@
+"""Microbenchmark: serialización de 50k filas (ORM + jsonify estándar vs proyección + orjson)
+
+Uso:
+    python bench_json.py [filas]
+
+Usa una base SQLite en memoria, no necesita MySQL.
+"""
+import os
+import sys
+import time
+import json
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import select
+
+from app import app, db, orjson, User, Product, Sale, project, PRODUCT_COLUMNS, SALE_COLUMNS
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    admin = User(username='bench', name='Bench', role='admin', store_type='cerveza', password_hash='x')
+    db.session.add(admin)
+    db.session.flush()
+    db.session.execute(Product.__table__.insert(), [
+        {
+            'name': f'Producto {i}', 'price_provider': 1000.0 + i, 'price_client': 1500.0 + i,
+            'stock': 100, 'category': 'General', 'store_type': 'cerveza', 'user_id': admin.id
+        }
+        for i in range(ROWS)
+    ])
+    db.session.execute(Sale.__table__.insert(), [
+        {
+            'product_id': i + 1, 'product_name': f'Producto {i}', 'quantity': 1,
+            'total_price': 1500.0 + i, 'customer_name': 'Cliente', 'customer_phone': '',
+            'payment_type': 'cash', 'employee_id': admin.id
+        }
+        for i in range(ROWS)
+    ])
+    db.session.commit()
+    return admin.id
+
+
+def legacy_products(owner_id):
+    products = Product.query.filter_by(store_type='cerveza', user_id=owner_id).all()
+    data = [{
+        'id': p.id, 'name': p.name, 'price_provider': p.price_provider,
+        'price_client': p.price_client, 'stock': p.stock, 'category': p.category
+    } for p in products]
+    return json.dumps(data)
+
+
+def legacy_sales(owner_id):
+    product_ids = [p.id for p in Product.query.filter_by(user_id=owner_id).all()]
+    sales = Sale.query.filter(Sale.product_id.in_(product_ids)).all()
+    data = [{
+        'id': s.id, 'product_name': s.product.name, 'quantity': s.quantity,
+        'total_price': s.total_price, 'customer_name': s.customer_name,
+        'employee_name': s.employee.name, 'payment_type': s.payment_type,
+        'created_at': s.created_at.isoformat()
+    } for s in sales]
+    return json.dumps(data)
+
+
+def fast_products(owner_id):
+    data = project(select(*PRODUCT_COLUMNS).where(Product.store_type == 'cerveza', Product.user_id == owner_id))
+    return app.json.dumps(data)
+
+
+def fast_sales(owner_id):
+    stmt = (
+        select(*SALE_COLUMNS)
+        .join(Product, Sale.product_id == Product.id)
+        .join(User, Sale.employee_id == User.id)
+        .where(Product.user_id == owner_id)
+    )
+    return app.json.dumps(project(stmt))
+
+
+def timed(fn, owner_id, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        fn(owner_id)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        owner_id = seed()
+        print(f"Filas: {ROWS} | backend JSON: {'orjson' if orjson else 'json estándar'}")
+        for name, legacy, fast in (
+            ('productos', legacy_products, fast_products),
+            ('ventas', legacy_sales, fast_sales),
+        ):
+            t_legacy = timed(legacy, owner_id)
+            t_fast = timed(fast, owner_id)
+            print(f"{name:10s} ORM+json: {t_legacy * 1000:8.1f} ms | proyección+rápido: {t_fast * 1000:8.1f} ms"
+                  f" | x{t_legacy / t_fast:.1f}")
@@ -0,0 +1,91 @@
+"""Benchmark de latencia de la búsqueda de productos con 100k productos
+
+Uso:
+    python bench_search.py [productos]
+
+Usa una base SQLite en memoria (ruta del trie de prefijos), no necesita MySQL. La ruta de
+producción en MySQL (índice FULLTEXT) se verifica compilando sus consultas con el dialecto MySQL.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+
+from app import (app, db, User, Product, project, search_products, get_search_trie, search_tokens,
+                 fulltext_search_stmt, PRODUCT_COLUMNS)
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+PRENDAS = ['camisa', 'pantalón', 'chaqueta', 'vestido', 'falda', 'blusa', 'jean', 'sudadera', 'gorra', 'medias']
+COLORES = ['rojo', 'azul', 'negro', 'blanco', 'verde', 'gris', 'café', 'rosado']
+TALLAS = ['xs', 's', 'm', 'l', 'xl', 'xxl']
+MARCAS = ['andina', 'costa', 'llanera', 'paisa', 'caribe', 'pacífico', 'sabana']
+CATEGORIAS = ['Hombre', 'Mujer', 'Niños', 'Accesorios']
+QUERIES = ['cam', 'camisa azul', 'jean negro xl', 'sud', 'vestido rosado m', 'gorra caribe', 'chaq gris', 'medias']
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    admin = User(username='bench', name='Bench', role='admin', store_type='ropa', password_hash='x')
+    db.session.add(admin)
+    db.session.flush()
+    rng = random.Random(42)
+    db.session.execute(Product.__table__.insert(), [
+        {
+            'name': f'{rng.choice(PRENDAS)} {rng.choice(COLORES)} {rng.choice(TALLAS)} {rng.choice(MARCAS)} {i}',
+            'price_provider': 10000.0, 'price_client': 15000.0, 'stock': rng.choice([0, 3, 10, 25]),
+            'category': rng.choice(CATEGORIAS), 'store_type': 'ropa', 'user_id': admin.id
+        }
+        for i in range(ROWS)
+    ])
+    db.session.commit()
+    return admin.id
+
+
+def like_scan(owner_id, query, limit):
+    stmt = select(*PRODUCT_COLUMNS).where(Product.user_id == owner_id, Product.store_type == 'ropa', Product.stock > 0)
+    for token in query.split():
+        stmt = stmt.where(Product.name.ilike(f'%{token}%'))
+    return project(stmt.order_by(Product.name).limit(limit))
+
+
+def check_fulltext(owner_id):
+    """Compila con el dialecto MySQL la consulta FULLTEXT de cada búsqueda; falla si no se puede construir"""
+    base = select(*PRODUCT_COLUMNS).where(Product.user_id == owner_id, Product.store_type == 'ropa', Product.stock > 0)
+    for query in QUERIES:
+        tokens = search_tokens(query)
+        if all(len(token) >= 2 for token in tokens):
+            str(fulltext_search_stmt(base, tokens, 10).compile(dialect=mysql.dialect()))
+    print(f"FULLTEXT (MySQL): {len(QUERIES)} consultas compiladas correctamente")
+
+
+def measure(fn, owner_id, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            fn(owner_id, query, 10)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        owner_id = seed()
+        check_fulltext(owner_id)
+        start = time.perf_counter()
+        get_search_trie(owner_id, 'ropa')
+        print(f"Productos: {ROWS} | construcción del trie: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        fast = lambda owner, q, k: search_products(owner, 'ropa', q, k)
+        for name, fn in (('trie', fast), ('LIKE %q%', like_scan)):
+            p50, p95 = measure(fn, owner_id)
+            print(f"{name:10s} p50: {p50:7.2f} ms | p95: {p95:7.2f} ms")
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Ruta al .env dentro de la carpeta gigitnore
@@ -26,15 +27,16 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'test')
     DB_PORT = os.getenv('DB_PORT', '3306')
 
-    # Cadena de conexión SQLAlchemy
-    SQLALCHEMY_DATABASE_URI = (
+    # Cadena de conexión SQLAlchemy (DATABASE_URL tiene prioridad si está definida)
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        'DATABASE_URL',
         f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
 
     # Mostrar la URI sin la contraseña real
     print(
         "[INFO] URI de conexión:",
-        SQLALCHEMY_DATABASE_URI.replace(DB_PASSWORD, "******"),
+        SQLALCHEMY_DATABASE_URI.replace(DB_PASSWORD, "******") if DB_PASSWORD else SQLALCHEMY_DATABASE_URI,
         flush=True
     )
 
@@ -42,3 +44,52 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     ITEMS_PER_PAGE = 20
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+    # Compresión de respuestas y caché de archivos estáticos
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+    STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+    # Cola de tareas posteriores a la venta (outbox)
+    OUTBOX_WORKER_THREADS = int(os.getenv('OUTBOX_WORKER_THREADS', '1'))
+    OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', '5'))
+    OUTBOX_BATCH_SIZE = 50
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_LOCK_TIMEOUT = 300
+    OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '7'))  # trabajos terminados que se conservan
+    LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', '5'))
+
+    # Sincronización de ventas hechas sin conexión
+    SYNC_MAX_BATCH = 500
+
+    # Claves de idempotencia para operaciones de escritura (encabezado Idempotency-Key)
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+    IDEMPOTENCY_CACHE_SIZE = 2048
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '300'))  # reserva sin respuesta: se da por abandonada
+
+    # Importación masiva de productos
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_MAX_ERRORS = 1000
+
+    # Fotos periódicas de inventario (kardex)
+    STOCK_SNAPSHOT_INTERVAL_HOURS = int(os.getenv('STOCK_SNAPSHOT_INTERVAL_HOURS', '24'))
+
+    # Suscripciones: días por periodo y bloqueo automático de cuentas vencidas
+    SUBSCRIPTION_DAYS = int(os.getenv('SUBSCRIPTION_DAYS', '30'))
+
+    # Archivo histórico: meses que se conservan en las tablas y carpeta de los archivos comprimidos
+    ARCHIVE_RETENTION_MONTHS = int(os.getenv('ARCHIVE_RETENTION_MONTHS', '12'))
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+
+    # Tries de búsqueda en memoria (motores sin FULLTEXT): tiendas que se conservan por proceso
+    SEARCH_TRIE_CACHE_SIZE = int(os.getenv('SEARCH_TRIE_CACHE_SIZE', '8'))
+
+    # Caché del catálogo por tienda (JSON ya serializado): entradas en memoria por proceso y
+    # archivos en disco compartidos entre los workers de gunicorn de la misma máquina
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', '32'))
+    CATALOG_CACHE_DIR = os.getenv('CATALOG_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bodega-catalog'))
+    CATALOG_CACHE_FILES = int(os.getenv('CATALOG_CACHE_FILES', '256'))
+    # Los ids de movimiento se asignan al insertar, no al confirmar: cada delta vuelve a leer esta
+    # cantidad de ids por debajo del cursor para no perder movimientos confirmados tarde
+    CATALOG_DELTA_WINDOW = int(os.getenv('CATALOG_DELTA_WINDOW', '1000'))
+    # Movimientos de stock que puede quedar atrás el cursor del catálogo en caché antes de reconstruirlo
+    CATALOG_MAX_CURSOR_LAG = int(os.getenv('CATALOG_MAX_CURSOR_LAG', '20000'))
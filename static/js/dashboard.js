@@ -0,0 +1,683 @@
+let products = [];
+let sales = [];
+let credits = [];
+let employees = []; // Variable para empleados
+let editingEmployeeId = null; // Variable para edición de empleados
+let deletingEmployeeId = null; // Variable para eliminación de empleados
+let saleIdempotencyKey = null; // Se reutiliza en reintentos y dobles clics de la misma venta
+let paymentIdempotencyKey = null; // Igual para el pago de crédito en curso
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}-${Math.random().toString(16).slice(2)}`;
+}
+
+// Funciones de tabs
+function showTab(tabName) {
+    // Ocultar todos los tabs
+    document.querySelectorAll('.tab-content').forEach(tab => {
+        tab.classList.add('hidden');
+    });
+    
+    // Mostrar el tab seleccionado
+    document.getElementById(tabName + '-tab').classList.remove('hidden');
+    
+    // Actualizar estilos de botones
+    document.querySelectorAll('.tab-button').forEach(btn => {
+        btn.classList.remove('border-blue-500', 'text-blue-600');
+        btn.classList.add('border-transparent', 'text-gray-500');
+    });
+    
+    document.querySelector(`[data-tab="${tabName}"]`).classList.remove('border-transparent', 'text-gray-500');
+    document.querySelector(`[data-tab="${tabName}"]`).classList.add('border-blue-500', 'text-blue-600');
+    
+    // Cargar datos según el tab
+    if (tabName === 'products') {
+        loadProducts();
+    } else if (tabName === 'sales') {
+        loadSales();
+    } else if (tabName === 'employees') { // Cargar empleados
+        loadEmployees();
+    } else if (tabName === 'credits') {
+        loadCredits();
+    } else if (tabName === 'reports') {
+        updateReports();
+    }
+}
+
+async function loadEmployees() {
+    try {
+        const response = await fetch('/api/employees');
+        employees = await response.json();
+        renderEmployees();
+    } catch (error) {
+        console.error('Error loading employees:', error);
+    }
+}
+
+function renderEmployees() {
+    const employeesList = document.getElementById('employees-list');
+    employeesList.innerHTML = '';
+    
+    employees.forEach(employee => {
+        const employeeDiv = document.createElement('div');
+        employeeDiv.className = 'flex items-center justify-between p-4 border rounded-lg';
+        
+        const statusBadge = getEmployeeStatusBadge(employee);
+        
+        employeeDiv.innerHTML = `
+            <div class="flex-1">
+                <div class="flex items-center gap-3">
+                    <h3 class="font-semibold">${employee.name}</h3>
+                    <span class="px-2 py-1 text-xs rounded-full bg-gray-100 text-gray-800">Empleado</span>
+                    <span class="px-2 py-1 text-xs rounded-full ${statusBadge.class}">${statusBadge.text}</span>
+                </div>
+                <div class="flex gap-4 text-sm text-gray-600">
+                    <span>Usuario: ${employee.username}</span>
+                    <span>Creado: ${new Date(employee.created_at).toLocaleDateString()}</span>
+                </div>
+            </div>
+            <div class="flex gap-2">
+                <button onclick="editEmployee(${employee.id})" class="p-2 text-gray-600 hover:text-blue-600" title="Editar">
+                    <i data-lucide="edit" class="w-4 h-4"></i>
+                </button>
+                <button onclick="toggleEmployeeBlock(${employee.id})" class="p-2 ${employee.is_blocked ? 'text-green-600 hover:text-green-700' : 'text-red-600 hover:text-red-700'}" title="${employee.is_blocked ? 'Desbloquear' : 'Bloquear'}">
+                    <i data-lucide="${employee.is_blocked ? 'unlock' : 'lock'}" class="w-4 h-4"></i>
+                </button>
+                <button onclick="showDeleteEmployeeModal(${employee.id}, '${employee.name}')" class="p-2 text-red-600 hover:text-red-700" title="Eliminar">
+                    <i data-lucide="trash-2" class="w-4 h-4"></i>
+                </button>
+            </div>
+        `;
+        
+        employeesList.appendChild(employeeDiv);
+    });
+    
+    lucide.createIcons();
+}
+
+function getEmployeeStatusBadge(employee) {
+    if (employee.is_blocked) {
+        return { text: 'Bloqueado', class: 'bg-red-100 text-red-800' };
+    }
+    if (employee.is_expired) {
+        return { text: 'Expirado', class: 'bg-yellow-100 text-yellow-800' };
+    }
+    return { text: 'Activo', class: 'bg-green-100 text-green-800' };
+}
+
+function showEmployeeModal() {
+    editingEmployeeId = null;
+    document.getElementById('employeeModalTitle').textContent = 'Crear Empleado';
+    document.getElementById('employeeForm').reset();
+    document.getElementById('employeeModal').classList.remove('hidden');
+}
+
+function hideEmployeeModal() {
+    document.getElementById('employeeModal').classList.add('hidden');
+}
+
+function editEmployee(employeeId) {
+    const employee = employees.find(e => e.id === employeeId);
+    if (!employee) return;
+    
+    editingEmployeeId = employeeId;
+    document.getElementById('employeeModalTitle').textContent = 'Editar Empleado';
+    document.getElementById('employeeId').value = employee.id;
+    document.getElementById('employeeName').value = employee.name;
+    document.getElementById('employeeUsername').value = employee.username;
+    document.getElementById('employeePassword').value = '';
+    
+    document.getElementById('employeeModal').classList.remove('hidden');
+}
+
+function showDeleteEmployeeModal(employeeId, employeeName) {
+    deletingEmployeeId = employeeId;
+    document.getElementById('deleteEmployeeMessage').textContent = 
+        `¿Estás seguro de que deseas eliminar al empleado "${employeeName}"? Esta acción no se puede deshacer.`;
+    document.getElementById('deleteEmployeeModal').classList.remove('hidden');
+}
+
+function hideDeleteEmployeeModal() {
+    deletingEmployeeId = null;
+    document.getElementById('deleteEmployeeModal').classList.add('hidden');
+}
+
+async function deleteEmployee() {
+    if (!deletingEmployeeId) return;
+    
+    try {
+        const response = await fetch(`/api/employees/${deletingEmployeeId}`, {
+            method: 'DELETE'
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            hideDeleteEmployeeModal();
+            loadEmployees();
+            alert('Empleado eliminado exitosamente');
+        } else {
+            alert(data.error || 'Error al eliminar empleado');
+        }
+    } catch (error) {
+        console.error('Error deleting employee:', error);
+        alert('Error de conexión');
+    }
+}
+
+async function toggleEmployeeBlock(employeeId) {
+    try {
+        const response = await fetch(`/api/employees/${employeeId}/toggle-block`, {
+            method: 'POST'
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            loadEmployees();
+        }
+    } catch (error) {
+        console.error('Error toggling employee block:', error);
+    }
+}
+
+document.getElementById('employeeForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    const employeeData = {
+        name: formData.get('name'),
+        username: formData.get('username'),
+        password: formData.get('password')
+    };
+    
+    try {
+        let response;
+        if (editingEmployeeId) {
+            response = await fetch(`/api/employees/${editingEmployeeId}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(employeeData)
+            });
+        } else {
+            response = await fetch('/api/employees', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(employeeData)
+            });
+        }
+        
+        const data = await response.json();
+        if (data.success) {
+            hideEmployeeModal();
+            loadEmployees();
+        } else {
+            alert(data.error || 'Error al guardar empleado');
+        }
+    } catch (error) {
+        console.error('Error saving employee:', error);
+        alert('Error de conexión');
+    }
+});
+
+document.getElementById('confirmDeleteEmployee').addEventListener('click', deleteEmployee);
+
+// Funciones de productos
+async function loadProducts() {
+    try {
+        const response = await fetch(`/api/products/${storeType}`);
+        products = await response.json();
+        renderProducts();
+        updateProductSelect();
+    } catch (error) {
+        console.error('Error loading products:', error);
+    }
+}
+
+function renderProducts() {
+    const productsList = document.getElementById('products-list');
+    productsList.innerHTML = '';
+    
+    products.forEach(product => {
+        const productDiv = document.createElement('div');
+        productDiv.className = 'flex items-center justify-between p-4 border rounded-lg';
+        
+        productDiv.innerHTML = `
+            <div class="flex-1">
+                <h3 class="font-semibold">${product.name}</h3>
+                <div class="flex gap-4 text-sm text-gray-600">
+                    <span>Precio Proveedor: $${product.price_provider}</span>
+                    <span>Precio Cliente: $${product.price_client}</span>
+                    <span>Stock: ${product.stock}</span>
+                    <span>Categoría: ${product.category}</span>
+                </div>
+            </div>
+            <div class="flex gap-2">
+                <button class="p-2 text-gray-600 hover:text-blue-600">
+                    <i data-lucide="edit" class="w-4 h-4"></i>
+                </button>
+                <button class="p-2 text-gray-600 hover:text-red-600">
+                    <i data-lucide="trash-2" class="w-4 h-4"></i>
+                </button>
+            </div>
+        `;
+        
+        productsList.appendChild(productDiv);
+    });
+    
+    lucide.createIcons();
+}
+
+function updateProductSelect() {
+    const select = document.getElementById('saleProduct');
+    select.innerHTML = '<option value="">Seleccionar producto</option>';
+    
+    products.filter(p => p.stock > 0).forEach(product => {
+        const option = document.createElement('option');
+        option.value = product.id;
+        option.textContent = `${product.name} - $${product.price_client} (Stock: ${product.stock})`;
+        select.appendChild(option);
+    });
+}
+
+function showProductModal() {
+    document.getElementById('productModal').classList.remove('hidden');
+}
+
+function hideProductModal() {
+    document.getElementById('productModal').classList.add('hidden');
+    document.getElementById('productForm').reset();
+}
+
+// Funciones de ventas
+async function loadSales() {
+    try {
+        const response = await fetch(`/api/sales/${storeType}`);
+        sales = await response.json();
+        renderSales();
+    } catch (error) {
+        console.error('Error loading sales:', error);
+    }
+}
+
+function renderSales() {
+    const salesList = document.getElementById('sales-list');
+    salesList.innerHTML = '';
+    
+    sales.forEach(sale => {
+        const saleDiv = document.createElement('div');
+        saleDiv.className = 'flex items-center justify-between p-4 border rounded-lg';
+        
+        const paymentBadge = sale.payment_type === 'cash' ? 'Contado' : 'Crédito';
+        
+        saleDiv.innerHTML = `
+            <div class="flex-1">
+                <div class="flex items-center gap-3">
+                    <h3 class="font-semibold">${sale.product_name}</h3>
+                    <span class="px-2 py-1 text-xs rounded-full bg-blue-100 text-blue-800">${paymentBadge}</span>
+                </div>
+                <div class="flex gap-4 text-sm text-gray-600">
+                    <span>Cantidad: ${sale.quantity}</span>
+                    <span>Total: $${sale.total}</span>
+                    <span>Cliente: ${sale.customer_name}</span>
+                    <span>Fecha: ${new Date(sale.created_at).toLocaleDateString()}</span>
+                    <span>Empleado: ${sale.employee_name}</span>
+                </div>
+            </div>
+            <button onclick="generateTicket(${sale.id})" class="inline-flex items-center px-3 py-1 border border-gray-300 rounded-md shadow-sm text-sm font-medium text-gray-700 bg-white hover:bg-gray-50">
+                <i data-lucide="file-text" class="w-4 h-4 mr-2"></i>
+                Ticket
+            </button>
+        `;
+        
+        salesList.appendChild(saleDiv);
+    });
+    
+    lucide.createIcons();
+}
+
+function showSaleModal() {
+    loadProducts(); // Cargar productos para el select
+    document.getElementById('saleModal').classList.remove('hidden');
+}
+
+function hideSaleModal() {
+    saleIdempotencyKey = null;
+    document.getElementById('saleModal').classList.add('hidden');
+    document.getElementById('saleForm').reset();
+}
+
+async function generateTicket(saleId) {
+    try {
+        const response = await fetch(`/api/ticket/${saleId}`);
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `ticket-${saleId}.pdf`;
+        a.click();
+        window.URL.revokeObjectURL(url);
+    } catch (error) {
+        console.error('Error generating ticket:', error);
+    }
+}
+
+// Funciones de créditos (solo para muebles)
+async function loadCredits() {
+    if (storeType !== 'muebles') return;
+    
+    try {
+        const response = await fetch(`/api/credits/${storeType}`);
+        credits = await response.json();
+        renderCredits();
+    } catch (error) {
+        console.error('Error loading credits:', error);
+    }
+}
+
+function renderCredits() {
+    const creditsList = document.getElementById('credits-list');
+    if (!creditsList) return;
+    
+    creditsList.innerHTML = '';
+    
+    credits.forEach(credit => {
+        const creditDiv = document.createElement('div');
+        creditDiv.className = 'p-4 border rounded-lg';
+        
+        const statusBadge = getStatusBadge(credit.status);
+        const progressPercentage = (credit.paid_amount / credit.total_amount * 100).toFixed(1);
+        
+        creditDiv.innerHTML = `
+            <div class="flex items-center justify-between mb-2">
+                <h3 class="font-semibold">${credit.customer_name}</h3>
+                <span class="px-2 py-1 text-xs rounded-full ${statusBadge.class}">${statusBadge.text}</span>
+            </div>
+            <div class="grid grid-cols-2 gap-4 text-sm mb-3">
+                <div>
+                    <p><strong>Producto:</strong> ${credit.product_name}</p>
+                    <p><strong>Total:</strong> $${credit.total_amount.toFixed(2)}</p>
+                    <p><strong>Pagado:</strong> $${credit.paid_amount.toFixed(2)}</p>
+                </div>
+                <div>
+                    <p><strong>Restante:</strong> $${credit.remaining_amount.toFixed(2)}</p>
+                    <p><strong>Cuotas:</strong> ${credit.installments} meses</p>
+                    <p><strong>Cuota:</strong> $${credit.installment_amount.toFixed(2)}</p>
+                    <p><strong>Próximo pago:</strong> ${new Date(credit.next_payment_date).toLocaleDateString()}</p>
+                </div>
+            </div>
+            
+            <div class="mb-3">
+                <div class="flex justify-between text-xs text-gray-600 mb-1">
+                    <span>Progreso</span>
+                    <span>${progressPercentage}%</span>
+                </div>
+                <div class="w-full bg-gray-200 rounded-full h-2">
+                    <div class="bg-blue-600 h-2 rounded-full" style="width: ${progressPercentage}%"></div>
+                </div>
+            </div>
+            
+            <div class="flex gap-2">
+                <button onclick="showCreditDetail(${credit.id})" class="inline-flex items-center px-3 py-1 border border-transparent rounded-md shadow-sm text-sm font-medium text-white bg-blue-600 hover:bg-blue-700">
+                    <i data-lucide="credit-card" class="w-4 h-4 mr-2"></i>
+                    Ver Detalle
+                </button>
+                <button onclick="generateCreditReport(${credit.id})" class="inline-flex items-center px-3 py-1 border border-gray-300 rounded-md shadow-sm text-sm font-medium text-gray-700 bg-white hover:bg-gray-50">
+                    <i data-lucide="file-text" class="w-4 h-4 mr-2"></i>
+                    Reporte
+                </button>
+            </div>
+        `;
+        
+        creditsList.appendChild(creditDiv);
+    });
+    
+    lucide.createIcons();
+}
+
+function getStatusBadge(status) {
+    switch (status) {
+        case 'active':
+            return { text: 'Activo', class: 'bg-green-100 text-green-800' };
+        case 'completed':
+            return { text: 'Completado', class: 'bg-blue-100 text-blue-800' };
+        case 'overdue':
+            return { text: 'Vencido', class: 'bg-red-100 text-red-800' };
+        default:
+            return { text: status, class: 'bg-gray-100 text-gray-800' };
+    }
+}
+
+// Funciones de reportes
+function updateReports() {
+    const totalSales = sales.length;
+    const totalRevenue = sales.reduce((sum, sale) => sum + sale.total, 0);
+    const totalStock = products.reduce((sum, product) => sum + product.stock, 0);
+    
+    document.getElementById('total-sales').textContent = totalSales;
+    document.getElementById('total-revenue').textContent = `$${totalRevenue}`;
+    document.getElementById('total-stock').textContent = totalStock;
+}
+
+// Event listeners
+document.getElementById('productForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    const productData = {
+        name: formData.get('name'),
+        price_provider: parseFloat(formData.get('price_provider')),
+        price_client: parseFloat(formData.get('price_client')),
+        stock: parseInt(formData.get('stock')),
+        category: formData.get('category'),
+        sku: formData.get('sku') || null
+    };
+    
+    try {
+        const response = await fetch('/api/products', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(productData)
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            hideProductModal();
+            loadProducts();
+        } else {
+            alert(data.error || 'Error al crear producto');
+        }
+    } catch (error) {
+        console.error('Error creating product:', error);
+        alert('Error de conexión');
+    }
+});
+
+document.getElementById('saleForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    const saleData = {
+        product_id: parseInt(formData.get('product_id')),
+        quantity: parseInt(formData.get('quantity')),
+        customer_name: formData.get('customer_name'),
+        customer_phone: formData.get('customer_phone'),
+        payment_type: formData.get('payment_type') || 'cash',
+        customer_address: formData.get('customer_address') || '',
+        installments: parseInt(formData.get('installments')) || 6
+    };
+    
+    saleIdempotencyKey = saleIdempotencyKey || newIdempotencyKey();
+    
+    try {
+        const response = await fetch('/api/sales', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': saleIdempotencyKey },
+            body: JSON.stringify(saleData)
+        });
+        
+        // Un error del servidor (5xx) o una petición aún en curso (409) se reintenta con la misma clave;
+        // cualquier otra respuesta ya quedó guardada
+        if (response.status < 500 && response.status !== 409) {
+            saleIdempotencyKey = null;
+        }
+        const data = await response.json();
+        if (data.success) {
+            hideSaleModal();
+            loadSales();
+            loadProducts(); // Actualizar stock
+            if (storeType === 'muebles') {
+                loadCredits(); // Actualizar créditos si es tienda de muebles
+            }
+        } else {
+            alert(data.error || 'Error al registrar venta');
+        }
+    } catch (error) {
+        console.error('Error creating sale:', error);
+        alert('Error de conexión');
+    }
+});
+
+// Mostrar/ocultar campos de crédito
+if (storeType === 'muebles') {
+    document.getElementById('paymentType').addEventListener('change', function(e) {
+        const creditFields = document.getElementById('creditFields');
+        if (e.target.value === 'credit') {
+            creditFields.classList.remove('hidden');
+            document.getElementById('customerAddress').required = true;
+            calculateInstallment(); // Calcular cuota al mostrar campos
+        } else {
+            creditFields.classList.add('hidden');
+            document.getElementById('customerAddress').required = false;
+        }
+    });
+}
+
+// Función para calcular y mostrar la cuota
+function calculateInstallment() {
+    const productSelect = document.getElementById('saleProduct');
+    const quantityInput = document.getElementById('quantity');
+    const installmentsSelect = document.getElementById('installments');
+    
+    if (!productSelect.value || !quantityInput.value) {
+        return;
+    }
+    
+    // Encontrar el producto seleccionado
+    const selectedProduct = products.find(p => p.id == productSelect.value);
+    if (!selectedProduct) return;
+    
+    const quantity = parseInt(quantityInput.value) || 0;
+    const total = selectedProduct.price_client * quantity;
+    const installments = parseInt(installmentsSelect.value);
+    const monthlyPayment = total / installments;
+    
+    // Actualizar la vista previa
+    document.getElementById('totalAmount').textContent = `$${total.toFixed(2)}`;
+    document.getElementById('monthlyPayment').textContent = `$${monthlyPayment.toFixed(2)}`;
+    
+    // Calcular fecha de primera cuota (30 días desde hoy)
+    const firstPaymentDate = new Date();
+    firstPaymentDate.setDate(firstPaymentDate.getDate() + 30);
+    document.getElementById('firstPaymentDate').textContent = firstPaymentDate.toLocaleDateString();
+}
+
+// Actualizar cálculo cuando cambie el producto o cantidad
+document.getElementById('saleProduct').addEventListener('change', calculateInstallment);
+document.getElementById('quantity').addEventListener('input', calculateInstallment);
+
+// Funciones para el modal de detalle de crédito
+function showCreditDetail(creditId) {
+    const credit = credits.find(c => c.id === creditId);
+    if (!credit) return;
+    
+    document.getElementById('creditDetailTitle').textContent = `Crédito - ${credit.customer_name}`;
+    document.getElementById('creditId').value = creditId;
+    
+    // Establecer fecha actual por defecto
+    document.getElementById('paymentDate').value = new Date().toISOString().split('T')[0];
+    
+    // Sugerir el monto de la cuota
+    document.getElementById('paymentAmount').value = credit.installment_amount.toFixed(2);
+    
+    const content = document.getElementById('creditDetailContent');
+    content.innerHTML = `
+        <div class="bg-gray-50 p-4 rounded-lg">
+            <div class="grid grid-cols-2 gap-4 text-sm">
+                <div>
+                    <p><strong>Cliente:</strong> ${credit.customer_name}</p>
+                    <p><strong>Teléfono:</strong> ${credit.customer_phone}</p>
+                    <p><strong>Dirección:</strong> ${credit.customer_address}</p>
+                    <p><strong>Producto:</strong> ${credit.product_name}</p>
+                </div>
+                <div>
+                    <p><strong>Total:</strong> $${credit.total_amount.toFixed(2)}</p>
+                    <p><strong>Pagado:</strong> $${credit.paid_amount.toFixed(2)}</p>
+                    <p><strong>Restante:</strong> $${credit.remaining_amount.toFixed(2)}</p>
+                    <p><strong>Cuotas:</strong> ${credit.installments} meses</p>
+                    <p><strong>Cuota mensual:</strong> $${credit.installment_amount.toFixed(2)}</p>
+                    <p><strong>Próximo pago:</strong> ${new Date(credit.next_payment_date).toLocaleDateString()}</p>
+                </div>
+            </div>
+        </div>
+        
+        <div class="bg-blue-50 p-4 rounded-lg">
+            <h5 class="font-medium text-blue-900 mb-2">Progreso del Pago</h5>
+            <div class="w-full bg-blue-200 rounded-full h-2">
+                <div class="bg-blue-600 h-2 rounded-full" style="width: ${(credit.paid_amount / credit.total_amount * 100).toFixed(1)}%"></div>
+            </div>
+            <p class="text-sm text-blue-700 mt-1">${(credit.paid_amount / credit.total_amount * 100).toFixed(1)}% completado</p>
+        </div>
+    `;
+    
+    document.getElementById('creditDetailModal').classList.remove('hidden');
+    lucide.createIcons();
+}
+
+function hideCreditDetailModal() {
+    paymentIdempotencyKey = null;
+    document.getElementById('creditDetailModal').classList.add('hidden');
+    document.getElementById('paymentForm').reset();
+}
+
+// Event listener para el formulario de pago
+document.getElementById('paymentForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    const paymentData = {
+        amount: parseFloat(formData.get('amount')),
+        notes: formData.get('notes') || ''
+    };
+    
+    const creditId = formData.get('credit_id');
+    
+    paymentIdempotencyKey = paymentIdempotencyKey || newIdempotencyKey();
+    
+    try {
+        const response = await fetch(`/api/credits/${creditId}/payment`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': paymentIdempotencyKey },
+            body: JSON.stringify(paymentData)
+        });
+        
+        if (response.status < 500 && response.status !== 409) {
+            paymentIdempotencyKey = null;
+        }
+        const data = await response.json();
+        if (data.success) {
+            hideCreditDetailModal();
+            loadCredits(); // Recargar créditos
+            alert('Pago registrado exitosamente');
+        } else {
+            alert(data.error || 'Error al registrar pago');
+        }
+    } catch (error) {
+        console.error('Error registering payment:', error);
+        alert('Error de conexión');
+    }
+});
+
+// Inicializar
+showTab('products');
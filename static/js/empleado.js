@@ -0,0 +1,442 @@
+let products = [];
+let catalogVersion = null; // Versión del catálogo en memoria; el servidor solo manda deltas de stock si coincide
+let catalogCursor = 0;
+let sales = [];
+let syncing = false;
+let currentClientKey = null; // Clave de la venta en curso; se reutiliza en dobles clics
+
+const PENDING_SALES_KEY = `pendingSales:${storeType}`;
+
+// Funciones de tabs
+function showTab(tabName) {
+    // Ocultar todos los tabs
+    document.querySelectorAll('.tab-content').forEach(tab => {
+        tab.classList.add('hidden');
+    });
+    
+    // Mostrar el tab seleccionado
+    document.getElementById(tabName + '-tab').classList.remove('hidden');
+    
+    // Actualizar estilos de botones
+    document.querySelectorAll('.tab-button').forEach(btn => {
+        btn.classList.remove('border-blue-500', 'text-blue-600');
+        btn.classList.add('border-transparent', 'text-gray-500');
+    });
+    
+    document.querySelector(`[data-tab="${tabName}"]`).classList.remove('border-transparent', 'text-gray-500');
+    document.querySelector(`[data-tab="${tabName}"]`).classList.add('border-blue-500', 'text-blue-600');
+    
+    // Cargar datos según el tab
+    if (tabName === 'products') {
+        loadProducts();
+    } else if (tabName === 'sales') {
+        loadSales();
+    } else if (tabName === 'new-sale') {
+        loadProducts(); // Respaldo de la búsqueda de productos sin conexión
+    }
+}
+
+// Funciones de productos
+async function loadProducts() {
+    try {
+        const params = catalogVersion === null ? '' : `?version=${catalogVersion}&cursor=${catalogCursor}`;
+        const response = await fetch(`/api/products/${storeType}/catalog${params}`);
+        const data = await response.json();
+        if (data.catalog) {
+            products = data.catalog;
+        }
+        if (data.stock.length) {
+            const stockById = new Map(data.stock);
+            products.forEach(product => {
+                if (stockById.has(product.id)) {
+                    product.stock = stockById.get(product.id);
+                }
+            });
+        }
+        catalogVersion = data.version;
+        catalogCursor = data.cursor;
+        renderProducts();
+        searchSaleProducts(); // Refrescar el stock de los resultados mostrados
+    } catch (error) {
+        console.error('Error loading products:', error);
+    }
+}
+
+function renderProducts() {
+    const productsList = document.getElementById('products-list');
+    productsList.innerHTML = '';
+    
+    products.forEach(product => {
+        const productDiv = document.createElement('div');
+        productDiv.className = 'flex items-center justify-between p-4 border rounded-lg';
+        
+        const stockBadge = product.stock > 0 ? 
+            '<span class="px-2 py-1 text-xs rounded-full bg-green-100 text-green-800">Disponible</span>' :
+            '<span class="px-2 py-1 text-xs rounded-full bg-red-100 text-red-800">Agotado</span>';
+        
+        productDiv.innerHTML = `
+            <div class="flex-1">
+                <h3 class="font-semibold">${product.name}</h3>
+                <div class="flex gap-4 text-sm text-gray-600">
+                    <span>Precio: $${product.price_client}</span>
+                    <span>Stock: ${product.stock}</span>
+                    <span>Categoría: ${product.category}</span>
+                </div>
+            </div>
+            ${stockBadge}
+        `;
+        
+        productsList.appendChild(productDiv);
+    });
+}
+
+function updateProductSelect(results) {
+    const select = document.getElementById('saleProduct');
+    const selected = select.value;
+    select.innerHTML = results.length ?
+        '<option value="">Seleccionar producto</option>' :
+        '<option value="">Escribe para buscar un producto</option>';
+    
+    results.forEach(product => {
+        const option = document.createElement('option');
+        option.value = product.id;
+        option.textContent = `${product.name} - $${product.price_client} (Stock: ${product.stock})`;
+        select.appendChild(option);
+    });
+    select.value = results.some(product => String(product.id) === selected) ? selected : (results.length === 1 ? results[0].id : '');
+}
+
+// Búsqueda de productos para la venta: la hace el servidor; sin conexión se filtra el catálogo en memoria
+async function searchSaleProducts() {
+    const input = document.getElementById('saleProductSearch');
+    const query = input.value.trim();
+    if (!query) {
+        updateProductSelect([]);
+        return;
+    }
+    if (!navigator.onLine) {
+        const needle = query.toLowerCase();
+        updateProductSelect(products.filter(p => p.stock > 0 &&
+            (p.name.toLowerCase().includes(needle) || p.category.toLowerCase().includes(needle))).slice(0, 20));
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/products/${storeType}/search?q=${encodeURIComponent(query)}&limit=20`);
+        const results = await response.json();
+        // Ignorar respuestas de una búsqueda que el usuario ya cambió
+        if (input.value.trim() === query && Array.isArray(results)) {
+            updateProductSelect(results);
+        }
+    } catch (error) {
+        console.error('Error searching products:', error);
+    }
+}
+
+// Funciones de ventas
+async function loadSales() {
+    try {
+        const response = await fetch(`/api/sales/${storeType}`);
+        sales = await response.json();
+        renderSales();
+        updateDailySummary();
+    } catch (error) {
+        console.error('Error loading sales:', error);
+    }
+}
+
+function renderSales() {
+    const salesList = document.getElementById('sales-list');
+    salesList.innerHTML = '';
+    
+    sales.forEach(sale => {
+        const saleDiv = document.createElement('div');
+        saleDiv.className = 'flex items-center justify-between p-4 border rounded-lg';
+        
+        const paymentBadge = sale.payment_type === 'cash' ? 'Contado' : 'Crédito';
+        
+        saleDiv.innerHTML = `
+            <div class="flex-1">
+                <div class="flex items-center gap-3">
+                    <h3 class="font-semibold">${sale.product_name}</h3>
+                    <span class="px-2 py-1 text-xs rounded-full bg-blue-100 text-blue-800">${paymentBadge}</span>
+                </div>
+                <div class="flex gap-4 text-sm text-gray-600">
+                    <span>Cantidad: ${sale.quantity}</span>
+                    <span>Total: $${sale.total}</span>
+                    <span>Cliente: ${sale.customer_name}</span>
+                    <span>Fecha: ${new Date(sale.created_at).toLocaleDateString()}</span>
+                </div>
+            </div>
+            <button onclick="generateTicket(${sale.id})" class="inline-flex items-center px-3 py-1 border border-gray-300 rounded-md shadow-sm text-sm font-medium text-gray-700 bg-white hover:bg-gray-50">
+                <i data-lucide="file-text" class="w-4 h-4 mr-2"></i>
+                Ticket
+            </button>
+        `;
+        
+        salesList.appendChild(saleDiv);
+    });
+    
+    lucide.createIcons();
+}
+
+async function generateTicket(saleId) {
+    try {
+        const response = await fetch(`/api/ticket/${saleId}`);
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `ticket-${saleId}.pdf`;
+        a.click();
+        window.URL.revokeObjectURL(url);
+    } catch (error) {
+        console.error('Error generating ticket:', error);
+    }
+}
+
+function updateDailySummary() {
+    const today = new Date().toDateString();
+    const todaySales = sales.filter(sale => 
+        new Date(sale.created_at).toDateString() === today
+    );
+    
+    const dailySalesCount = todaySales.length;
+    const dailyRevenue = todaySales.reduce((sum, sale) => sum + sale.total, 0);
+    
+    document.getElementById('daily-sales').textContent = dailySalesCount;
+    document.getElementById('daily-revenue').textContent = `$${dailyRevenue}`;
+}
+
+// Cola de ventas sin conexión
+function newClientKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}-${Math.random().toString(16).slice(2)}`;
+}
+
+function getPendingSales() {
+    try {
+        return JSON.parse(localStorage.getItem(PENDING_SALES_KEY)) || [];
+    } catch (error) {
+        return [];
+    }
+}
+
+function setPendingSales(pending) {
+    localStorage.setItem(PENDING_SALES_KEY, JSON.stringify(pending));
+    updatePendingBadge();
+}
+
+function updatePendingBadge() {
+    const badge = document.getElementById('pending-sync');
+    const count = getPendingSales().length;
+    badge.textContent = `${count} venta(s) pendiente(s) de sincronizar`;
+    badge.classList.toggle('hidden', count === 0);
+}
+
+async function syncPendingSales() {
+    const pending = getPendingSales();
+    if (syncing || pending.length === 0 || !navigator.onLine) {
+        return;
+    }
+    
+    syncing = true;
+    try {
+        // El servidor rechaza lotes de más de syncMaxBatch ventas: la cola se envía por partes
+        const errors = [];
+        for (let start = 0; start < pending.length; start += syncMaxBatch) {
+            const response = await fetch('/api/sync/sales', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ sales: pending.slice(start, start + syncMaxBatch) })
+            });
+            const data = await response.json();
+            if (!data.success) {
+                console.error('Error syncing sales:', data.error);
+                break;
+            }
+            
+            // Las ventas creadas, duplicadas o rechazadas salen de la cola
+            const processed = new Set(data.results.map(result => result.client_key));
+            errors.push(...data.results.filter(result => result.status === 'error'));
+            setPendingSales(getPendingSales().filter(sale => !processed.has(sale.client_key)));
+        }
+        if (errors.length > 0) {
+            alert(`${errors.length} venta(s) sin conexión no se pudieron registrar:\n` +
+                  errors.map(result => result.error).join('\n'));
+        }
+        loadProducts();
+        loadSales();
+    } catch (error) {
+        console.error('Error syncing sales:', error);
+    } finally {
+        syncing = false;
+    }
+}
+
+// Event listeners
+document.getElementById('saleForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    currentClientKey = currentClientKey || newClientKey();
+    const saleData = {
+        client_key: currentClientKey,
+        product_id: parseInt(formData.get('product_id')),
+        quantity: parseInt(formData.get('quantity')),
+        customer_name: formData.get('customer_name'),
+        customer_phone: formData.get('customer_phone'),
+        payment_type: formData.get('payment_type') || 'cash',
+        customer_address: formData.get('customer_address') || '',
+        installments: parseInt(formData.get('installments')) || 6,
+        created_at: new Date().toISOString()
+    };
+    
+    const queueSale = () => {
+        currentClientKey = null;
+        setPendingSales([...getPendingSales(), saleData]);
+        alert('Sin conexión: la venta se guardó y se sincronizará automáticamente');
+        document.getElementById('saleForm').reset();
+    };
+    
+    if (!navigator.onLine) {
+        queueSale();
+        return;
+    }
+    
+    try {
+        // created_at solo sirve para la cola sin conexión: cambia en cada intento y alteraría la huella de la clave
+        const { created_at, ...onlineSale } = saleData;
+        const response = await fetch('/api/sales', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': saleData.client_key },
+            body: JSON.stringify(onlineSale)
+        });
+        
+        // Un error del servidor (5xx) o una petición aún en curso (409) se reintenta con la misma clave;
+        // cualquier otra respuesta ya quedó guardada
+        if (response.status < 500 && response.status !== 409) {
+            currentClientKey = null;
+        }
+        const data = await response.json();
+        if (data.success) {
+            alert('Venta registrada exitosamente');
+            document.getElementById('saleForm').reset();
+            loadProducts(); // Actualizar stock
+            loadSales(); // Actualizar ventas
+        } else {
+            alert(data.error || 'Error al registrar venta');
+        }
+    } catch (error) {
+        console.error('Error creating sale:', error);
+        queueSale();
+    }
+});
+
+// Limpiar el formulario descarta la venta en curso y su clave
+document.getElementById('saleForm').addEventListener('reset', function() {
+    currentClientKey = null;
+    updateProductSelect([]);
+});
+
+document.getElementById('saleProductSearch').addEventListener('input', searchSaleProducts);
+
+// Venta por código de barras: el lector escribe el código y envía Enter
+document.getElementById('scanForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const input = document.getElementById('scanCode');
+    const result = document.getElementById('scanResult');
+    const code = input.value.trim();
+    input.value = '';
+    if (!code) {
+        return;
+    }
+    
+    const saleData = { code: code, quantity: 1, client_key: newClientKey() };
+    try {
+        const response = await fetch('/api/sales/scan', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': saleData.client_key },
+            body: JSON.stringify(saleData)
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            result.textContent = `Venta registrada (#${data.sale_id})`;
+            loadProducts();
+            loadSales();
+        } else {
+            result.textContent = data.error || 'Error al registrar venta';
+        }
+    } catch (error) {
+        console.error('Error scanning sale:', error);
+        result.textContent = 'Error de conexión';
+    }
+    input.focus();
+});
+
+// Autocompletado de clientes por teléfono
+let customerOptions = [];
+
+document.getElementById('customerPhone').addEventListener('input', async function(e) {
+    const query = e.target.value.trim();
+    const selected = customerOptions.find(customer => customer.phone === query);
+    if (selected) {
+        document.getElementById('customerName').value = selected.name;
+        const address = document.getElementById('customerAddress');
+        if (address && !address.value) {
+            address.value = selected.address || '';
+        }
+        return;
+    }
+    if (query.length < 3 || !navigator.onLine) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/customers/search?q=${encodeURIComponent(query)}`);
+        customerOptions = await response.json();
+        document.getElementById('customerOptions').innerHTML = customerOptions.map(customer =>
+            `<option value="${customer.phone}">${customer.name}</option>`
+        ).join('');
+    } catch (error) {
+        console.error('Error searching customers:', error);
+    }
+});
+
+window.addEventListener('online', syncPendingSales);
+setInterval(syncPendingSales, 30000);
+
+// Mostrar/ocultar campos de crédito
+if (storeType === 'muebles') {
+    document.getElementById('paymentType').addEventListener('change', function(e) {
+        const creditFields = document.getElementById('creditFields');
+        if (e.target.value === 'credit') {
+            creditFields.classList.remove('hidden');
+            document.getElementById('customerAddress').required = true;
+        } else {
+            creditFields.classList.add('hidden');
+            document.getElementById('customerAddress').required = false;
+        }
+    });
+}
+
+function calculateInstallment() {
+    const totalAmount = parseFloat(document.getElementById('quantity').value) * parseFloat(document.querySelector('#saleProduct option:checked').textContent.split('$')[1].split(' ')[0]);
+    const installments = parseInt(document.getElementById('installments').value);
+    const monthlyPayment = totalAmount / installments;
+    const firstPaymentDate = new Date();
+    firstPaymentDate.setMonth(firstPaymentDate.getMonth() + 1);
+
+    document.getElementById('totalAmount').textContent = `$${totalAmount.toFixed(2)}`;
+    document.getElementById('monthlyPayment').textContent = `$${monthlyPayment.toFixed(2)}`;
+    document.getElementById('firstPaymentDate').textContent = firstPaymentDate.toLocaleDateString();
+}
+
+// Inicializar
+showTab('products');
+updatePendingBadge();
+syncPendingSales();
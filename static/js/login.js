@@ -0,0 +1,55 @@
+function togglePassword() {
+    const passwordInput = document.getElementById('password');
+    const eyeIcon = document.getElementById('eyeIcon');
+    
+    if (passwordInput.type === 'password') {
+        passwordInput.type = 'text';
+        eyeIcon.setAttribute('data-lucide', 'eye-off');
+    } else {
+        passwordInput.type = 'password';
+        eyeIcon.setAttribute('data-lucide', 'eye');
+    }
+    
+    lucide.createIcons();
+}
+
+document.getElementById('loginForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const loginBtn = document.getElementById('loginBtn');
+    const errorDiv = document.getElementById('error-message');
+    
+    loginBtn.textContent = 'Iniciando sesión...';
+    loginBtn.disabled = true;
+    errorDiv.classList.add('hidden');
+    
+    const formData = {
+        username: document.getElementById('username').value.trim(),
+        password: document.getElementById('password').value
+    };
+    
+    try {
+        const response = await fetch('/login', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(formData)
+        });
+
+        const data = await response.json().catch(() => ({})); // Si no es JSON, devolver objeto vacío
+        
+        if (data.success) {
+            window.location.href = data.redirect;
+        } else {
+            errorDiv.textContent = data.error || 'Error desconocido';
+            errorDiv.classList.remove('hidden');
+        }
+
+    } catch (error) {
+        console.error('Error details:', error);
+        errorDiv.textContent = 'No se pudo conectar con el servidor.';
+        errorDiv.classList.remove('hidden');
+    } finally {
+        loginBtn.textContent = 'Iniciar Sesión';
+        loginBtn.disabled = false;
+    }
+});
@@ -0,0 +1,294 @@
+let users = [];
+let editingUserId = null;
+let deletingUserId = null; // Variable para el usuario a eliminar
+const selectedUserIds = new Set(); // Usuarios marcados para acciones masivas
+
+async function loadUsers() {
+    try {
+        const response = await fetch('/api/users');
+        users = await response.json();
+        renderUsers();
+    } catch (error) {
+        console.error('Error loading users:', error);
+    }
+}
+
+function renderUsers() {
+    const usersList = document.getElementById('users-list');
+    usersList.innerHTML = '';
+    
+    users.forEach(user => {
+        const userDiv = document.createElement('div');
+        userDiv.className = 'flex items-center justify-between p-4 border rounded-lg';
+        
+        const statusBadge = getStatusBadge(user);
+        const roleBadge = user.role === 'admin' ? 'Administrador' : 'Empleado';
+        const storeBadge = getStoreBadge(user.store_type);
+        
+        const expiresText = user.subscription_expires_at
+            ? new Date(user.subscription_expires_at + 'Z').toLocaleDateString()
+            : 'Sin vencimiento';
+        
+        userDiv.innerHTML = `
+            <input type="checkbox" class="mr-4" ${selectedUserIds.has(user.id) ? 'checked' : ''} onchange="toggleUserSelection(${user.id}, this.checked)">
+            <div class="flex-1">
+                <div class="flex items-center gap-3">
+                    <h3 class="font-semibold">${user.name}</h3>
+                    <span class="px-2 py-1 text-xs rounded-full ${user.role === 'admin' ? 'bg-blue-100 text-blue-800' : 'bg-gray-100 text-gray-800'}">${roleBadge}</span>
+                    <span class="px-2 py-1 text-xs rounded-full bg-gray-100 text-gray-800">${storeBadge}</span>
+                    <span class="px-2 py-1 text-xs rounded-full ${statusBadge.class}">${statusBadge.text}</span>
+                </div>
+                <p class="text-sm text-gray-600">Usuario: ${user.username}</p>
+                <p class="text-sm text-gray-500">Creado: ${new Date(user.created_at).toLocaleDateString()} · Vence: ${expiresText}</p>
+            </div>
+            <div class="flex gap-2">
+                <button onclick="renewUser(${user.id})" class="p-2 text-gray-600 hover:text-green-600" title="Renovar suscripción">
+                    <i data-lucide="calendar-plus" class="w-4 h-4"></i>
+                </button>
+                <button onclick="editUser(${user.id})" class="p-2 text-gray-600 hover:text-blue-600" title="Editar">
+                    <i data-lucide="edit" class="w-4 h-4"></i>
+                </button>
+                <button onclick="toggleUserBlock(${user.id})" class="p-2 ${user.is_blocked ? 'text-green-600 hover:text-green-700' : 'text-red-600 hover:text-red-700'}" title="${user.is_blocked ? 'Desbloquear' : 'Bloquear'}">
+                    <i data-lucide="${user.is_blocked ? 'unlock' : 'lock'}" class="w-4 h-4"></i>
+                </button>
+                <button onclick="showDeleteModal(${user.id}, '${user.name}')" class="p-2 text-red-600 hover:text-red-700" title="Eliminar">
+                    <i data-lucide="trash-2" class="w-4 h-4"></i>
+                </button>
+            </div>
+        `;
+        
+        usersList.appendChild(userDiv);
+    });
+    
+    lucide.createIcons();
+}
+
+async function loadTenants() {
+    try {
+        const response = await fetch('/api/tenants');
+        const tenants = await response.json();
+        renderTenants(tenants);
+    } catch (error) {
+        console.error('Error loading tenants:', error);
+    }
+}
+
+function renderTenants(tenants) {
+    const money = value => `$${Number(value).toLocaleString()}`;
+    document.getElementById('tenants-list').innerHTML = tenants.map(tenant => {
+        const statusBadge = getStatusBadge(tenant);
+        const lastActivity = tenant.last_activity
+            ? new Date(tenant.last_activity + 'Z').toLocaleString()
+            : 'Sin actividad';
+        return `
+            <tr class="border-t">
+                <td class="py-2 pr-4">
+                    <span class="font-medium">${tenant.name}</span>
+                    <span class="ml-2 px-2 py-1 text-xs rounded-full ${statusBadge.class}">${statusBadge.text}</span>
+                </td>
+                <td class="py-2 pr-4">${getStoreBadge(tenant.store_type)}</td>
+                <td class="py-2 pr-4 text-right">${tenant.employees}</td>
+                <td class="py-2 pr-4 text-right">${tenant.products}</td>
+                <td class="py-2 pr-4 text-right">${tenant.sales_30d}</td>
+                <td class="py-2 pr-4 text-right">${money(tenant.revenue_30d)}</td>
+                <td class="py-2 pr-4 text-right">${money(tenant.open_credit)}</td>
+                <td class="py-2">${lastActivity}</td>
+            </tr>
+        `;
+    }).join('');
+}
+
+function getStatusBadge(user) {
+    if (user.is_blocked) {
+        return { text: 'Bloqueada', class: 'bg-red-100 text-red-800' };
+    }
+    if (user.is_expired) {
+        return { text: 'Expirada', class: 'bg-yellow-100 text-yellow-800' };
+    }
+    return { text: 'Activa', class: 'bg-green-100 text-green-800' };
+}
+
+function getStoreBadge(storeType) {
+    switch (storeType) {
+        case 'ropa': return 'Tienda Ropa';
+        case 'muebles': return 'Tienda Muebles';
+        case 'cerveza': return 'Agencia Cerveza';
+        default: return storeType;
+    }
+}
+
+function showCreateUserModal() {
+    editingUserId = null;
+    document.getElementById('modalTitle').textContent = 'Crear Usuario';
+    document.getElementById('userForm').reset();
+    document.getElementById('userModal').classList.remove('hidden');
+}
+
+function hideUserModal() {
+    document.getElementById('userModal').classList.add('hidden');
+}
+
+function showDeleteModal(userId, userName) {
+    deletingUserId = userId;
+    document.getElementById('deleteMessage').textContent = 
+        `¿Estás seguro de que deseas eliminar al usuario "${userName}"? Esta acción no se puede deshacer.`;
+    document.getElementById('deleteModal').classList.remove('hidden');
+}
+
+function hideDeleteModal() {
+    deletingUserId = null;
+    document.getElementById('deleteModal').classList.add('hidden');
+}
+
+async function deleteUser() {
+    if (!deletingUserId) return;
+    
+    try {
+        const response = await fetch(`/api/users/${deletingUserId}`, {
+            method: 'DELETE'
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            hideDeleteModal();
+            loadUsers();
+            alert('Usuario eliminado exitosamente');
+        } else {
+            alert(data.error || 'Error al eliminar usuario');
+        }
+    } catch (error) {
+        console.error('Error deleting user:', error);
+        alert('Error de conexión');
+    }
+}
+
+function editUser(userId) {
+    const user = users.find(u => u.id === userId);
+    if (!user) return;
+    
+    editingUserId = userId;
+    document.getElementById('modalTitle').textContent = 'Editar Usuario';
+    document.getElementById('userId').value = user.id;
+    document.getElementById('name').value = user.name;
+    document.getElementById('modalUsername').value = user.username;
+    document.getElementById('modalPassword').value = '';
+    document.getElementById('role').value = user.role;
+    document.getElementById('storeType').value = user.store_type;
+    
+    document.getElementById('userModal').classList.remove('hidden');
+}
+
+async function toggleUserBlock(userId) {
+    try {
+        const response = await fetch(`/api/users/${userId}/toggle-block`, {
+            method: 'POST'
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            loadUsers();
+        }
+    } catch (error) {
+        console.error('Error toggling user block:', error);
+    }
+}
+
+async function renewUser(userId) {
+    try {
+        const response = await fetch(`/api/users/${userId}/renew`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({})
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            loadUsers();
+        } else {
+            alert(data.error || 'Error al renovar suscripción');
+        }
+    } catch (error) {
+        console.error('Error renewing user:', error);
+        alert('Error de conexión');
+    }
+}
+
+function toggleUserSelection(userId, checked) {
+    if (checked) {
+        selectedUserIds.add(userId);
+    } else {
+        selectedUserIds.delete(userId);
+    }
+    document.getElementById('bulk-actions').classList.toggle('hidden', selectedUserIds.size === 0);
+    document.getElementById('bulk-count').textContent = `${selectedUserIds.size} seleccionados`;
+}
+
+async function bulkUserAction(action) {
+    if (selectedUserIds.size === 0) return;
+    
+    try {
+        const response = await fetch('/api/users/bulk', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ action, user_ids: [...selectedUserIds] })
+        });
+        
+        const data = await response.json();
+        if (data.success) {
+            selectedUserIds.clear();
+            document.getElementById('bulk-actions').classList.add('hidden');
+            loadUsers();
+        } else {
+            alert(data.error || 'Error al actualizar usuarios');
+        }
+    } catch (error) {
+        console.error('Error in bulk action:', error);
+        alert('Error de conexión');
+    }
+}
+
+document.getElementById('userForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+    
+    const formData = new FormData(e.target);
+    const userData = {
+        name: formData.get('name'),
+        username: formData.get('username'),
+        password: formData.get('password'),
+        role: formData.get('role'),
+        store_type: formData.get('storeType')
+    };
+    
+    try {
+        let response;
+        if (editingUserId) {
+            response = await fetch(`/api/users/${editingUserId}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(userData)
+            });
+        } else {
+            response = await fetch('/api/users', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(userData)
+            });
+        }
+        
+        const data = await response.json();
+        if (data.success) {
+            hideUserModal();
+            loadUsers();
+        } else {
+            alert(data.error || 'Error al guardar usuario');
+        }
+    } catch (error) {
+        console.error('Error saving user:', error);
+        alert('Error de conexión');
+    }
+});
+
+document.getElementById('confirmDelete').addEventListener('click', deleteUser);
+
+loadUsers();
+loadTenants();